@@ -0,0 +1,92 @@
+"""
+Measures the parse time of generated DAG modules with operator imports at module level and with lazy_imports,
+where tasks are LazyOperators importing their operator module when they execute.
+
+Every parse runs in a fresh interpreter with airflow already imported, like a DAG file processor forked from the
+scheduler, so the time is what one DAG file costs on top of airflow itself. The operators package must be
+importable, pass the Airflow DAGs folder with --pythonpath when it isn't on the path.
+
+    python benchmarks/dag_parse_benchmark.py /path/to/generated_configs --repeat 5 --dag-count 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from constants.constants import dag_template
+from core_utils.config_reader import ConfigReader
+from core_utils.dag_generator import DagGenerator
+
+PARSE_SCRIPT = """
+import runpy, sys, time
+import airflow
+from airflow import DAG
+from airflow.models import BaseOperator
+from airflow.operators.empty import EmptyOperator
+
+start = time.perf_counter()
+runpy.run_path(sys.argv[1])
+print(time.perf_counter() - start)
+"""
+
+
+def list_datasets(configs_root_dir):
+    return sorted(dataset_name for dataset_name in os.listdir(configs_root_dir)
+                  if os.path.isfile(os.path.join(configs_root_dir, dataset_name, f"{dataset_name}.json")))
+
+
+def render_dag(configs_root_dir, dataset_name, lazy_imports):
+    dataset_configs = ConfigReader(os.path.join(configs_root_dir, dataset_name), dataset_name).read_configs()
+    return DagGenerator(configs_root_dir, dataset_name, lazy_imports=lazy_imports).generate_dag(dataset_configs,
+                                                                                              dag_template)
+
+
+def time_parse(dag_path, repeat, pythonpath=None):
+    # LazyOperator DAGs import core_utils, as installed on the Airflow workers
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in (pythonpath, REPO_DIR, env.get("PYTHONPATH")) if path)
+
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PARSE_SCRIPT, dag_path], env=env, capture_output=True,
+                                text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Failed to parse {dag_path}: {result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the parse time of generated DAGs with eager and lazy "
+                                                 "operator imports")
+    parser.add_argument("configs_root_dir", help="generated_configs directory")
+    parser.add_argument("--datasets", nargs="*", help="Datasets to benchmark, all of them by default")
+    parser.add_argument("--repeat", type=int, default=5, help="Parses per DAG and mode, the median is reported")
+    parser.add_argument("--dag-count", type=int, default=400, help="Number of DAGs the total is projected for")
+    parser.add_argument("--pythonpath", help="Directory holding the operators package")
+    args = parser.parse_args()
+
+    datasets = args.datasets or list_datasets(args.configs_root_dir)
+    results = {"eager": [], "lazy": []}
+    with tempfile.TemporaryDirectory() as dags_dir:
+        for dataset_name in datasets:
+            for mode, lazy_imports in (("eager", False), ("lazy", True)):
+                dag_path = os.path.join(dags_dir, f"{dataset_name}_{mode}_dag.py")
+                with open(dag_path, "w") as file:
+                    file.write(render_dag(args.configs_root_dir, dataset_name, lazy_imports))
+                results[mode].append(time_parse(dag_path, args.repeat, args.pythonpath))
+            print(f"{dataset_name}: eager {results['eager'][-1] * 1000:.1f} ms, "
+                  f"lazy {results['lazy'][-1] * 1000:.1f} ms")
+
+    for mode, timings in results.items():
+        per_dag = statistics.mean(timings)
+        print(f"{mode}: {per_dag * 1000:.1f} ms per DAG, {per_dag * args.dag_count:.1f} s for {args.dag_count} DAGs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from core_utils.config_bundle import compile_config_bundle
+from core_utils.generate_configs import ConfigTemplate
+
+# Manifest columns which are not ConfigTemplate keyword arguments under the same name
+MANIFEST_ALIASES = {"schedule": "schedule_interval"}
+SUMMARY_FIELDS = ["dataset_name", "file_path", "status", "error", "elapsed_seconds", "configs_dir", "changed",
+                  "unchanged", "removed"]
+
+
+def read_manifest(manifest_path):
+    """
+    Reads a manifest of datasets from a CSV or YAML file. Each row or list item holds the ConfigTemplate arguments
+    of one dataset, e.g. bucket, file_path, dataset_name, pipeline_type, layer and schedule.
+    A YAML manifest is either a list of datasets or a mapping with a datasets list.
+
+    :param manifest_path: Path to the manifest file
+    :return: List of dataset dicts
+    """
+    if manifest_path.lower().endswith((".yml", ".yaml")):
+        from ruamel.yaml import YAML
+
+        with open(manifest_path, "r") as file:
+            manifest = YAML(typ="safe").load(file) or []
+        datasets = manifest.get("datasets", []) if isinstance(manifest, dict) else manifest
+    else:
+        with open(manifest_path, "r", newline="") as file:
+            datasets = [{key: get_manifest_value(value) for key, value in row.items() if value not in (None, "")}
+                        for row in csv.DictReader(file)]
+
+    return [{MANIFEST_ALIASES.get(key, key): value for key, value in dataset.items()} for dataset in datasets]
+
+
+def get_manifest_value(value):
+    value = value.strip()
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    return value
+
+
+def generate_dataset_configs(dataset, configs_tmp_dir):
+    """
+    Generates the configs of one manifest dataset. Runs in a worker process and never raises,
+    failures are returned in the summary row so the rest of the batch carries on.
+
+    :param dataset: Dataset dict from the manifest
+    :param configs_tmp_dir: Directory the configs are generated into
+    :return: Summary dict
+    """
+    start_time = time.time()
+    summary = {"dataset_name": dataset.get("dataset_name"), "file_path": dataset.get("file_path"),
+               "status": "SUCCESS", "error": "", "configs_dir": ""}
+    try:
+        kwargs = dict(dataset)
+        config_template = ConfigTemplate(kwargs.pop("bucket", None), **kwargs)
+        summary["configs_dir"] = config_template.generate_configs(configs_tmp_dir)
+        summary.update(config_template.generation_report.summary())
+    except Exception as e:
+        logging.error(f"Failed to generate configs for {summary['dataset_name']}: {e}")
+        summary["status"] = "FAILED"
+        summary["error"] = f"{type(e).__name__}: {e}"
+
+    summary["elapsed_seconds"] = round(time.time() - start_time, 3)
+    return summary
+
+
+def get_failed_summary(dataset, error):
+    return {"dataset_name": dataset.get("dataset_name"), "file_path": dataset.get("file_path"), "status": "FAILED",
+            "error": f"{type(error).__name__}: {error}", "elapsed_seconds": None, "configs_dir": ""}
+
+
+def run_in_pool(datasets, configs_tmp_dir, max_workers, write_summary):
+    """
+    Generates the configs of datasets over one process pool, writing each summary as it finishes.
+
+    :param datasets: List of (manifest index, dataset dict)
+    :return: List of (manifest index, dataset dict, error) of the datasets left unfinished because a worker
+             process died, e.g. killed for memory, which breaks the pool
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(generate_dataset_configs, dataset, configs_tmp_dir): (index, dataset)
+                   for index, dataset in datasets}
+        for future in as_completed(futures):
+            index, dataset = futures[future]
+            try:
+                summary = future.result()
+            except BrokenProcessPool as e:
+                unfinished.append((index, dataset, e))
+                continue
+            except Exception as e:
+                summary = get_failed_summary(dataset, e)
+            write_summary(summary)
+    return unfinished
+
+
+def generate_configs_from_manifest(manifest_path, configs_tmp_dir, summary_path=None, max_workers=None,
+                                   compile_bundle=True):
+    """
+    Generates configs for every dataset in a manifest, profiling and generating the datasets in parallel over a
+    process pool. Each dataset's result is appended to the summary file as soon as it finishes,
+    as JSON lines or as CSV when summary_path ends with .csv.
+    A worker process dying breaks the pool for every dataset in flight, so unfinished datasets are resubmitted
+    to a fresh pool, and datasets caught in a second broken pool are run alone. Only a dataset whose worker
+    dies while running alone is failed.
+
+    :param manifest_path: Path to the CSV or YAML manifest
+    :param configs_tmp_dir: Directory the configs are generated into
+    :param summary_path: Summary file, defaults to generation_summary.jsonl in configs_tmp_dir
+    :param max_workers: Number of worker processes, defaults to the number of CPUs
+    :param compile_bundle: Compile the generated configs of every dataset into configs_bundle.json afterwards
+    :return: List of summary dicts
+    """
+    datasets = read_manifest(manifest_path)
+    summary_path = summary_path or os.path.join(configs_tmp_dir, "generation_summary.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(datasets), 1))
+    logging.info(f"Generating configs for {len(datasets)} datasets with {max_workers} workers")
+
+    summaries = []
+    with open(summary_path, "w", newline="") as summary_file:
+        csv_writer = None
+        if summary_path.lower().endswith(".csv"):
+            csv_writer = csv.DictWriter(summary_file, fieldnames=SUMMARY_FIELDS)
+            csv_writer.writeheader()
+
+        def write_summary(summary):
+            if csv_writer:
+                csv_writer.writerow(summary)
+            else:
+                summary_file.write(json.dumps(summary) + "\n")
+            summary_file.flush()
+            summaries.append(summary)
+
+        pending = list(enumerate(datasets))
+        pool_breaks = {}
+        while pending:
+            shared = [(index, dataset) for index, dataset in pending if pool_breaks.get(index, 0) < 2]
+            unfinished = run_in_pool(shared, configs_tmp_dir, max_workers, write_summary) if shared else []
+
+            for index, dataset in pending:
+                if pool_breaks.get(index, 0) < 2:
+                    continue
+                for _, _, error in run_in_pool([(index, dataset)], configs_tmp_dir, 1, write_summary):
+                    logging.error(f"Worker generating configs for {dataset.get('dataset_name')} died: {error}")
+                    write_summary(get_failed_summary(dataset, error))
+
+            for index, dataset, _ in unfinished:
+                pool_breaks[index] = pool_breaks.get(index, 0) + 1
+            if unfinished:
+                logging.warning(f"A worker process died, resubmitting {len(unfinished)} unfinished datasets")
+            pending = [(index, dataset) for index, dataset, _ in unfinished]
+
+    configs_root_dir = os.path.join(configs_tmp_dir, "generated_configs")
+    if compile_bundle and os.path.isdir(configs_root_dir):
+        compile_config_bundle(configs_root_dir)
+
+    failed = sum(summary["status"] != "SUCCESS" for summary in summaries)
+    logging.info(f"Generated configs for {len(summaries) - failed} datasets, {failed} failed, summary: {summary_path}")
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate dataset configs from a CSV or YAML manifest")
+    parser.add_argument("manifest_path")
+    parser.add_argument("configs_tmp_dir")
+    parser.add_argument("--summary-path")
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--no-bundle", action="store_true", help="Don't compile the configs bundle")
+    args = parser.parse_args()
+
+    generate_configs_from_manifest(args.manifest_path, args.configs_tmp_dir, summary_path=args.summary_path,
+                                   max_workers=args.max_workers, compile_bundle=not args.no_bundle)
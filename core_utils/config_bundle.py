@@ -0,0 +1,120 @@
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from core_utils.config_loader import VersionIndex, CONFIG_CACHE_SIZE
+from core_utils.output_sinks import FileSystemSink
+
+CONFIG_BUNDLE_FILE_NAME = "configs_bundle.json"
+# Directories of generated_configs which hold generated outputs rather than dataset configs
+CONFIG_BUNDLE_SKIP_DIRS = {"generated_dags_ddls"}
+
+
+def compile_config_bundle(configs_root_dir, bundle_path=None, sink=None):
+    """
+    Merges the dataset, mirror and stage version configs of every dataset under configs_root_dir
+    (generated_configs) into one bundle file. Each dataset's configs are stored as one JSON document, keyed by
+    their path relative to the dataset directory, and the bundle carries a sha256 of its content.
+    Readers open one file whatever the number of datasets and only decode the datasets they use.
+
+    :param configs_root_dir: generated_configs directory with one directory per dataset
+    :param bundle_path: Bundle file, defaults to configs_bundle.json in configs_root_dir
+    :param sink: OutputSink the bundle is written to, unchanged bundles are not rewritten
+    :return: Path to the bundle
+    """
+    bundle_path = bundle_path or os.path.join(configs_root_dir, CONFIG_BUNDLE_FILE_NAME)
+    datasets = {}
+    for dataset_name in sorted(os.listdir(configs_root_dir)):
+        dataset_dir = os.path.join(configs_root_dir, dataset_name)
+        if dataset_name in CONFIG_BUNDLE_SKIP_DIRS or not os.path.isfile(os.path.join(dataset_dir,
+                                                                                        f"{dataset_name}.json")):
+            continue
+
+        dataset_files = {}
+        for root, dirs, files in os.walk(dataset_dir):
+            dirs[:] = sorted(dir_name for dir_name in dirs if not dir_name.startswith("."))
+            for file_name in sorted(files):
+                # Hidden files are generation manifests, not configs
+                if file_name.endswith(".json") and not file_name.startswith("."):
+                    file_path = os.path.join(root, file_name)
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        dataset_files[Path(os.path.relpath(file_path, dataset_dir)).as_posix()] = json.load(file)
+        datasets[dataset_name] = json.dumps(dataset_files, sort_keys=True, separators=(",", ":"))
+
+    content_hash = hashlib.sha256(json.dumps(datasets, sort_keys=True).encode("utf-8")).hexdigest()
+    bundle = json.dumps({"content_hash": content_hash, "datasets": datasets}, sort_keys=True)
+    status = (sink or FileSystemSink()).write(bundle_path, bundle)
+    logging.info(f"Compiled configs of {len(datasets)} datasets into {bundle_path} ({status}, {content_hash[:12]})")
+    return bundle_path
+
+
+class ConfigBundle():
+    """
+    Compiled configs bundle, read with one file open. Datasets are decoded on first access.
+    """
+
+    def __init__(self, bundle_path):
+        self.bundle_path = bundle_path
+        with open(bundle_path, 'r', encoding='utf-8') as file:
+            bundle = json.load(file)
+        self.content_hash = bundle["content_hash"]
+        self.datasets = bundle["datasets"]
+        self.decoded = {}
+        self.version_indexes = {}
+
+    def dataset_names(self):
+        return sorted(self.datasets)
+
+    def get_dataset(self, dataset_name):
+        """
+        Returns the configs of a dataset keyed by their path relative to the dataset directory,
+        e.g. mirror/<dataset_name>_mirror_ver.json.
+        """
+        if dataset_name not in self.decoded:
+            if dataset_name not in self.datasets:
+                raise KeyError(f"Dataset {dataset_name} is not in config bundle {self.bundle_path}")
+            self.decoded[dataset_name] = json.loads(self.datasets[dataset_name])
+        return self.decoded[dataset_name]
+
+    def read_json(self, dataset_name, relative_path):
+        """
+        Returns a copy of one config of a dataset, as reading its JSON file would.
+        """
+        dataset_files = self.get_dataset(dataset_name)
+        relative_path = Path(relative_path).as_posix()
+        if relative_path not in dataset_files:
+            raise FileNotFoundError(f"{dataset_name}/{relative_path} is not in config bundle {self.bundle_path}")
+        return copy.deepcopy(dataset_files[relative_path])
+
+    def get_version_index(self, dataset_name, layer):
+        if (dataset_name, layer) not in self.version_indexes:
+            versions = self.get_dataset(dataset_name)[f"{layer}/{dataset_name}_{layer}_ver.json"]["versions"]
+            self.version_indexes[(dataset_name, layer)] = VersionIndex(versions)
+        return self.version_indexes[(dataset_name, layer)]
+
+
+@lru_cache(maxsize=CONFIG_CACHE_SIZE)
+def build_config_bundle(bundle_path, mtime_ns, size):
+    return ConfigBundle(bundle_path)
+
+
+def load_config_bundle(bundle_path):
+    """
+    Returns the ConfigBundle of bundle_path, opened once per bundle content and shared within the process.
+    """
+    stat = os.stat(bundle_path)
+    return build_config_bundle(os.path.abspath(bundle_path), stat.st_mtime_ns, stat.st_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the generated configs of every dataset into one bundle")
+    parser.add_argument("configs_root_dir")
+    parser.add_argument("--bundle-path")
+    args = parser.parse_args()
+
+    compile_config_bundle(args.configs_root_dir, bundle_path=args.bundle_path)
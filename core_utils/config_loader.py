@@ -0,0 +1,160 @@
+import copy
+import json
+import logging
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Number of parsed config files kept per process, overridable with CORE_UTILS_CONFIG_CACHE_SIZE
+CONFIG_CACHE_SIZE_ENV = "CORE_UTILS_CONFIG_CACHE_SIZE"
+CONFIG_CACHE_SIZE = 1024
+
+
+class ConfigLoader():
+    """
+    Process wide LRU cache of parsed JSON config files, keyed by path and validated against the file's mtime
+    and size on every read, so a regenerated config is picked up while repeated reads by DAG generation,
+    dbt generation and operators in the same process only cost a stat and a dict lookup.
+    Callers get deep copies and can modify them freely.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv(CONFIG_CACHE_SIZE_ENV, CONFIG_CACHE_SIZE))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load_json(self, file_path):
+        """
+        Returns the parsed content of a JSON file, from the cache when the file is unchanged since it was read.
+
+        :param file_path: Path to the JSON file
+        :return: Deep copy of the parsed JSON
+        """
+        cache_key = os.path.abspath(file_path)
+        stat = os.stat(cache_key)
+        file_version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry[0] == file_version:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+
+        with open(cache_key, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+
+        with self.lock:
+            self.entries[cache_key] = (file_version, data)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return copy.deepcopy(data)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "max_entries": self.max_entries}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+        logging.info("Cleared config cache")
+
+
+CONFIG_LOADER = ConfigLoader()
+
+
+def load_json(file_path):
+    """
+    Reads a JSON config file through the process wide ConfigLoader.
+    """
+    return CONFIG_LOADER.load_json(file_path)
+
+
+def get_current_version(versions, run_date=None):
+    """
+    Returns the version entry whose start and end dates cover run_date, or the latest version when none does.
+
+    :param versions: Versions list of a DatasetVersion config
+    :param run_date: Date as YYYY-MM-DD, defaults to today
+    :return: Version entry
+    """
+    run_date = run_date or date.today().strftime("%Y-%m-%d")
+    for version_info in versions:
+        if version_info["start_date"] <= run_date <= version_info["end_date"]:
+            return version_info
+    return max(versions, key=lambda version_info: int(version_info["version"][1:]))
+
+
+def to_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+class VersionIndex():
+    """
+    Versions of a dataset layer as sorted, pre-parsed date intervals. A run date is resolved with a bisect over
+    the start dates, and a date range is split into the segments each version covers in one pass.
+    """
+
+    def __init__(self, versions):
+        intervals = sorted((to_date(version_info["start_date"]), to_date(version_info["end_date"]),
+                            version_info["version"]) for version_info in versions)
+        self.start_dates = [start_date for start_date, _, _ in intervals]
+        self.end_dates = [end_date for _, end_date, _ in intervals]
+        self.versions = [version for _, _, version in intervals]
+
+    def get_version(self, run_date):
+        """
+        Returns the version covering run_date (a date or YYYY-MM-DD), or None when no version covers it.
+        """
+        run_date = to_date(run_date)
+        index = bisect_right(self.start_dates, run_date) - 1
+        if index >= 0 and run_date <= self.end_dates[index]:
+            return self.versions[index]
+        return None
+
+    def get_segments(self, start_date, end_date):
+        """
+        Splits start_date to end_date into consecutive segments of one version each, e.g. for a backfill.
+        Dates no version covers are returned as segments with version None.
+
+        :return: List of (version, segment start date, segment end date)
+        """
+        start_date, end_date = to_date(start_date), to_date(end_date)
+        segments = []
+        index = max(bisect_right(self.start_dates, start_date) - 1, 0)
+        day = start_date
+        while day <= end_date:
+            while index < len(self.versions) and self.end_dates[index] < day:
+                index += 1
+            if index < len(self.versions) and self.start_dates[index] <= day:
+                version, segment_end = self.versions[index], min(self.end_dates[index], end_date)
+            else:
+                next_start = self.start_dates[index] if index < len(self.versions) else end_date + timedelta(days=1)
+                version, segment_end = None, min(next_start - timedelta(days=1), end_date)
+            segments.append((version, day, segment_end))
+            if segment_end == date.max:
+                break
+            day = segment_end + timedelta(days=1)
+        return segments
+
+
+@lru_cache(maxsize=CONFIG_CACHE_SIZE)
+def build_version_index(file_path, mtime_ns, size):
+    return VersionIndex(load_json(file_path)["versions"])
+
+
+def load_version_index(file_path):
+    """
+    Returns the VersionIndex of a _ver.json file, built once per file content and shared within the process.
+    """
+    stat = os.stat(file_path)
+    return build_version_index(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
@@ -1,48 +1,54 @@
 import json
 import os
 
+from core_utils.config_bundle import load_config_bundle
+from core_utils.config_loader import load_json, get_current_version
+from core_utils.output_sinks import FileSystemSink
+
 
 class ConfigReader():
-    def __init__(self, config_path, dataset_name):
+    def __init__(self, config_path, dataset_name, sink=None, run_date=None, bundle=None):
         self.config_path = config_path
         self.dataset_name = dataset_name
+        # OutputSink the configs were generated into, defaults to the file system
+        self.sink = sink or FileSystemSink()
+        # Date (YYYY-MM-DD) the current mirror and stage versions are picked for, defaults to today
+        self.run_date = run_date
+        # Compiled config bundle (ConfigBundle or its path) read instead of the config files
+        self.bundle = load_config_bundle(bundle) if isinstance(bundle, str) else bundle
+
+    def read_json(self, file_path):
+        if self.bundle is not None:
+            return self.bundle.read_json(self.dataset_name, os.path.relpath(file_path, self.config_path))
+        # Config files on disk are read through the process wide cache
+        if isinstance(self.sink, FileSystemSink):
+            return load_json(file_path)
+        return json.loads(self.sink.read(file_path))
+
+    def read_layer_configs(self, layer):
+        """
+        Reads every version of a layer, merging each version's dates with its version file.
+
+        :param layer: mirror or stage
+        :return: dict of version -> configs, and the current version
+        """
+        layer_dir = os.path.join(self.config_path, layer)
+        ver_configs = self.read_json(os.path.join(layer_dir, f"{self.dataset_name}_{layer}_ver.json"))
+
+        layer_configs = {}
+        for version_info in ver_configs["versions"]:
+            version_configs = self.read_json(os.path.join(layer_dir,
+                                                          f"{self.dataset_name}_{layer}_{version_info['version']}.json"))
+            layer_configs[version_info["version"]] = {**version_info, **version_configs}
+
+        return layer_configs, get_current_version(ver_configs["versions"], self.run_date)["version"]
 
     def read_configs(self):
         # Load configuration template
         dataset_config_json_path = os.path.join(self.config_path, f"{self.dataset_name}.json")
-        with open(dataset_config_json_path, 'r') as file:
-            dataset_configs = json.load(file)
-
-        dataset_configs_mirror_ver_path = os.path.join(self.config_path, "mirror",
-                                                       f"{self.dataset_name}_mirror_ver.json")
-        with open(dataset_configs_mirror_ver_path, 'r') as file:
-            mirror_ver_configs = json.load(file)
-        versions = mirror_ver_configs["versions"][0]
-
-        dataset_configs_mirror_v1_path = os.path.join(self.config_path, "mirror",
-                                                      f"{self.dataset_name}_mirror_v1.json")
-        with open(dataset_configs_mirror_v1_path, 'r') as file:
-            mirror_v1_configs = json.load(file)
-        v1_configs = mirror_v1_configs
-
-        mirror_configs = {**versions, **v1_configs}
-
-        dataset_configs["mirror"] = {"v1": mirror_configs}
-
-        dataset_configs_stage_ver_path = os.path.join(self.config_path, "stage",
-                                                      f"{self.dataset_name}_stage_ver.json")
-        with open(dataset_configs_stage_ver_path, 'r') as file:
-            stage_ver_configs = json.load(file)
-        versions = stage_ver_configs["versions"][0]
-
-        dataset_configs_stage_v1_path = os.path.join(self.config_path, "stage",
-                                                     f"{self.dataset_name}_stage_v1.json")
-        with open(dataset_configs_stage_v1_path, 'r') as file:
-            stage_v1_configs = json.load(file)
-        v1_configs = stage_v1_configs
-
-        stage_configs = {**versions, **v1_configs}
+        dataset_configs = self.read_json(dataset_config_json_path)
 
-        dataset_configs["stage"] = {"v1": stage_configs}
+        dataset_configs["mirror"], dataset_configs["mirror_version"] = self.read_layer_configs("mirror")
+        dataset_configs["stage"], dataset_configs["stage_version"] = self.read_layer_configs("stage")
 
-        return dataset_configs
\ No newline at end of file
+        return dataset_configs
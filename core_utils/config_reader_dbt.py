@@ -1,25 +1,62 @@
-import json
 import os
+from collections.abc import Mapping
 from typing import List, Dict, Any
-from datetime import datetime
+from datetime import timedelta
 import logging
 
+from core_utils.config_bundle import load_config_bundle
+from core_utils.config_loader import load_json, load_version_index, to_date, VersionIndex
+
+class VersionConfigs(Mapping):
+    """
+    Version configs of a dataset layer by version, each version file is only read when its version is looked up.
+    """
+
+    def __init__(self, layer_dir, dataset_name, layer, versions, read_json=load_json):
+        self.layer_dir = layer_dir
+        self.dataset_name = dataset_name
+        self.layer = layer
+        self.versions = versions
+        self.read_json = read_json
+        self.loaded = {}
+
+    def __getitem__(self, version):
+        if version not in self.versions:
+            raise KeyError(version)
+        if version not in self.loaded:
+            self.loaded[version] = self.read_json(os.path.join(self.layer_dir,
+                                                               f"{self.dataset_name}_{self.layer}_{version}.json"))
+        return self.loaded[version]
+
+    def __iter__(self):
+        return iter(self.versions)
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __repr__(self):
+        return f"VersionConfigs({self.layer}: {self.versions}, loaded: {list(self.loaded)})"
+
+
 class ConfigReaderDBT():
 
-    def __init__(self,dataset_configs_path,dataset_name,run_date):
+    def __init__(self,dataset_configs_path,dataset_name,run_date,bundle=None):
         self.dataset_configs_path = dataset_configs_path
         self.dataset_name = dataset_name
         self.run_date = run_date
+        # Compiled config bundle (ConfigBundle or its path) read instead of the config files
+        self.bundle = load_config_bundle(bundle) if isinstance(bundle, str) else bundle
 
     def read_json_file(self,file_path: str) -> Dict[str, Any]:
         """
-        Reads a JSON file and returns its content as a dictionary.
+        Reads a JSON file through the process wide config cache and returns its content as a dictionary.
 
         :param file_path: Path to the JSON file
         :return: Dictionary with JSON data
         """
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        if self.bundle is not None:
+            return self.bundle.read_json(self.dataset_name, os.path.relpath(file_path, self.dataset_configs_path))
+        return load_json(file_path)
 
 
     def get_current_version(self,dataset):
@@ -29,52 +66,41 @@ class ConfigReaderDBT():
         :param dataset: Dictionary containing dataset details with versions
         :return: The version string if current date is within range, otherwise None
         """
-        current_date = datetime.strptime(self.run_date, '%Y-%m-%d').date()
-        versions = dataset.get('versions', [])
+        return VersionIndex(dataset.get('versions', [])).get_version(self.run_date)
 
-        for version_info in versions:
-            start_date = datetime.strptime(version_info['start_date'], '%Y-%m-%d').date()
-            end_date = datetime.strptime(version_info['end_date'], '%Y-%m-%d').date()
+    def get_version_index(self, layer):
+        """
+        Returns the VersionIndex of the mirror or stage layer, parsed once per _ver.json content in the process.
+        """
+        if self.bundle is not None:
+            return self.bundle.get_version_index(self.dataset_name, layer)
+        return load_version_index(os.path.join(self.dataset_configs_path, layer,
+                                               f"{self.dataset_name}_{layer}_ver.json"))
 
-            if start_date <= current_date <= end_date:
-                return version_info['version']
+    def get_layer_configs(self, layer):
+        layer_configs_dir = os.path.join(self.dataset_configs_path, layer)
+        layer_ver_file_path = os.path.join(layer_configs_dir, f"{self.dataset_name}_{layer}_ver.json")
+        layer_versions = self.read_json_file(layer_ver_file_path)
 
-        return None
+        # Version files are read on first access, usually only the current version's
+        layer_configs = VersionConfigs(layer_configs_dir, self.dataset_name, layer,
+                                       [details["version"] for details in layer_versions["versions"]],
+                                       read_json=self.read_json_file)
 
+        logging.info(f"{layer}_versions:{layer_versions}")
+        return layer_versions, layer_configs
 
     def get_mirror_configs(self):
-        mirror_configs_dir = os.path.join(self.dataset_configs_path,"mirror")
-        mirror_ver_file_path = os.path.join(mirror_configs_dir,f"{self.dataset_name}_mirror_ver.json")
-        mirror_versions = self.read_json_file(mirror_ver_file_path)
-
-        mirror_configs = {}
-
-        for index,details in enumerate(mirror_versions["versions"]):
-            mirror_configs_file_path = os.path.join(mirror_configs_dir, f"""{self.dataset_name}_mirror_{details["version"]}.json""")
-            mirror_ver_configs = self.read_json_file(mirror_configs_file_path)
-            mirror_configs[details["version"]] = mirror_ver_configs
-
-        logging.info(f"mirror_configs:{mirror_configs}")
-        logging.info(f"mirror_versions:{mirror_versions}")
-        return mirror_versions,mirror_configs
-
+        return self.get_layer_configs("mirror")
 
     def get_stage_configs(self):
-        stage_configs_dir = os.path.join(self.dataset_configs_path, "stage")
-        stage_ver_file_path = os.path.join(stage_configs_dir, f"{self.dataset_name}_stage_ver.json")
-        stage_versions = self.read_json_file(stage_ver_file_path)
+        return self.get_layer_configs("stage")
 
-        stage_configs = {}
-
-        for index, details in enumerate(stage_versions["versions"]):
-            stage_configs_file_path = os.path.join(stage_configs_dir, f"""{self.dataset_name}_stage_{details["version"]}.json""")
-            stage_ver_configs = self.read_json_file(stage_configs_file_path)
-            stage_configs[details["version"]] = stage_ver_configs
-        logging.info(f"stage_versions:{stage_versions}")
-        logging.info(f"stage_configs:{stage_configs}")
-        return stage_versions, stage_configs
-
-    def get_configs(self):
+    def get_configs(self, mirror_version=None, stage_version=None):
+        """
+        Builds the dbt configs of the dataset for the versions current on run_date, or for the given versions.
+        Only the two version files used are read.
+        """
         source_json_file_path = os.path.join(self.dataset_configs_path,f"{self.dataset_name}.json")
         source_configs = self.read_json_file(source_json_file_path)
 
@@ -82,8 +108,8 @@ class ConfigReaderDBT():
 
         stage_versions, stage_configs = self.get_stage_configs()
 
-        mirror_version = self.get_current_version(mirror_versions)
-        stage_version = self.get_current_version(stage_versions)
+        mirror_version = mirror_version or self.get_version_index("mirror").get_version(self.run_date)
+        stage_version = stage_version or self.get_version_index("stage").get_version(self.run_date)
 
         dataset_configs  = {self.dataset_name:{"mirror":{"database":source_configs["mirror_layer"]["database"],
                                             "schema":source_configs["mirror_layer"]["schema"],
@@ -100,3 +126,26 @@ class ConfigReaderDBT():
                                             "transformations":stage_configs[stage_version]["transformations"]}}}
         logging.info(f"dataset_configs:{dataset_configs}")
         return dataset_configs
+
+    def get_version_segments(self, start_date, end_date):
+        """
+        Resolves a whole date range, e.g. a backfill, to the segments over which both the mirror and the stage
+        version stay the same, in one call.
+
+        :param start_date: First run date (date or YYYY-MM-DD)
+        :param end_date: Last run date (date or YYYY-MM-DD)
+        :return: List of dicts with start_date, end_date, mirror_version and stage_version
+        """
+        mirror_index, stage_index = self.get_version_index("mirror"), self.get_version_index("stage")
+        # Both layers' segments cover the whole range, a combined segment starts wherever either changes version
+        boundaries = sorted({segment_start for index in (mirror_index, stage_index)
+                             for _, segment_start, _ in index.get_segments(start_date, end_date)})
+
+        segments = []
+        for position, segment_start in enumerate(boundaries):
+            segment_end = boundaries[position + 1] - timedelta(days=1) if position + 1 < len(boundaries) \
+                else to_date(end_date)
+            segments.append({"start_date": segment_start.isoformat(), "end_date": segment_end.isoformat(),
+                             "mirror_version": mirror_index.get_version(segment_start),
+                             "stage_version": stage_index.get_version(segment_start)})
+        return segments
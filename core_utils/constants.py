@@ -44,3 +44,66 @@ mirror_tr_meta_cols = ["CREATED_DTS","CREATED_BY"]
 mirror_addl_meta_cols = ["UPDATED_DTS","UPDATED_BY","UNIQUE_HASH_ID","ROW_HASH_ID"]
 stage_file_meta_cols = ["filename","file_row_number","file_last_modified"]
 stage_addl_meta_cols = ["ACTIVE_FL", "EFFECTIVE_START_DATE", "EFFECTIVE_END_DATE" ]
+
+# DAG task name -> operator module, operator class, task_id (local, S3 when they differ) and operator arguments.
+# An argument is the name of a value of DagGenerator.get_task_values, or (argument, value name) when they differ
+dag_task_operators = {
+    "acq_task": ("operators.acquisition_operator", "AcquisitionOperator",
+                 ("check_file_present", "check_file_present_on_s3"),
+                 ["s3_conn_id", "bucket_name", "dataset_dir", ("file_pattern", "file_name_pattern"),
+                  "datetime_pattern"]),
+    "download_task": ("operators.download_operator", "DownloadOperator",
+                      ("download_file_to_airflow_tmp_area", "download_file_from_s3_to_airflow_tmp_area"),
+                      ["s3_conn_id", "bucket_name", "dataset_dir", ("file_name", "file_name_pattern"),
+                       "datetime_pattern"]),
+    "move_to_snowflake_task": ("operators.move_file_to_snowflake_operator", "MoveFileToSnowflakeOperator",
+                               "move_file_to_snowflake_internal_stage", ["db_conn_id", "stage_name"]),
+    "snowflake_schema_check_task": ("operators.file_snowflake_table_schema_check_operator",
+                                    "FileSnowflakeTableSchemaCheckOperator", "check_schema_of_config_n_received_file",
+                                    ["db_conn_id", "s3_conn_id", "bucket_name", "configs_path", "dataset_name",
+                                     "encoding", "stage_name", "table_name"]),
+    "postgres_schema_check_task": ("operators.file_postgres_table_schema_check_operator",
+                                   "FilePostgresTableSchemaCheckOperator", "check_schema_of_config_n_received_file",
+                                   ["db_conn_id", "s3_conn_id", "bucket_name", "configs_path", "dataset_name",
+                                    "encoding"]),
+    "copy_to_snowflake_task": ("operators.snowflake_copy_operator", "SnowflakeCopyOperator",
+                               "copy_data_from_internal_stage",
+                               ["db_conn_id", "s3_conn_id", "bucket_name", "configs_path", "dataset_name", "encoding",
+                                "stage_name", "table_name"]),
+    "copy_to_postgres_task": ("operators.copy_file_to_postgres_operator", "CopyFileToPostgresOperator",
+                              "copy_data_from_file_to_postgres",
+                              ["db_conn_id", "encoding", "table_name", "file_format_params",
+                               ("datetime_pattern", "file_datetime_pattern")]),
+    "snowflake_file_mirror_data_check_task": ("operators.file_snowflake_table_data_check_operator",
+                                              "FileSnowflakeTableDataCheckOperator", "check_file_n_mirror_table_data",
+                                              ["db_conn_id", "s3_conn_id", "bucket_name", "configs_path",
+                                               "dataset_name", "encoding", "table_name"]),
+    "postgres_file_mirror_data_check_task": ("operators.file_postgres_table_data_check_operator",
+                                             "FilePostgresTableDataCheckOperator", "check_file_n_mirror_table_data",
+                                             ["db_conn_id", "s3_conn_id", "bucket_name", "configs_path",
+                                              "dataset_name", "encoding", "table_name"]),
+    "snowflake_mirror_task": ("operators.snowflake_load_to_mirror_operator", "SnowflakeLoadToMirrorOperator",
+                              "load_to_mirror_table",
+                              ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "postgres_mirror_task": ("operators.postgres_load_to_mirror_operator", "PostgresLoadToMirrorOperator",
+                             "load_to_mirror_table",
+                             ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "postgres_mirror_tests_task": ("operators.postgres_mirror_tests_operator", "PostgresMirrorTestsOperator",
+                                   "mirror_data_tests",
+                                   ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "snowflake_mirror_tests_task": ("operators.snowflake_mirror_tests_operator", "SnowflakeMirrorTestsOperator",
+                                    "mirror_data_tests",
+                                    ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "snowflake_stage_task": ("operators.snowflake_load_to_stage_operator", "SnowflakeLoadToStageOperator",
+                             "load_to_stage_table",
+                             ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "postgres_stage_task": ("operators.postgres_load_to_stage_operator", "PostgresLoadToStageOperator",
+                            "load_to_stage_table",
+                            ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "snowflake_stage_tests_task": ("operators.snowflake_stage_tests_operator", "SnowflakeStageTestsOperator",
+                                   "stage_data_tests",
+                                   ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+    "postgres_stage_tests_task": ("operators.postgres_stage_tests_operator", "PostgresStageTestsOperator",
+                                  "stage_data_tests",
+                                  ["s3_conn_id", "db_conn_id", "bucket_name", "configs_path", "dataset_name"]),
+}
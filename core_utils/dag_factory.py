@@ -0,0 +1,169 @@
+import importlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from core_utils.config_bundle import load_config_bundle
+from core_utils.config_reader import ConfigReader
+from core_utils.dag_generator import DagGenerator
+from core_utils.file_utils import write_to_file
+from core_utils.output_sinks import write_if_changed
+
+# Same as the default_args of the rendered DAG modules
+DAG_DEFAULT_ARGS = {
+    "owner": "airflow",
+    "depends_on_past": False,
+    "retries": 1,
+}
+DAG_FACTORY_FILE_NAME = "bundle_dags.py"
+DAG_FACTORY_ERRORS_FILE_NAME = "bundle_dags_errors.py"
+# Datasets whose DAG failed to build in the last parse of bundle_dags.py, next to it
+DAG_FACTORY_FAILURES_FILE_NAME = ".bundle_dags_failures.json"
+
+# Airflow's DAG_DISCOVERY_SAFE_MODE only parses files which mention both airflow and dag
+dag_factory_template = """from airflow import DAG  # noqa
+from core_utils.dag_factory import register_dags
+
+# Builds the DAG of every dataset in the config bundle in this one module
+register_dags(r"{bundle_path}", globals(), lazy_imports={lazy_imports})
+"""
+
+# Separate module so the datasets whose DAG fails to build show as its import error, while the DagBag keeps
+# the DAGs of bundle_dags.py. It only reads the failures bundle_dags.py recorded, no DAG is built twice
+dag_factory_errors_template = """import os
+
+from airflow import DAG  # noqa
+from core_utils.dag_factory import check_dags, DAG_FACTORY_FAILURES_FILE_NAME
+
+# Fails with the datasets of the config bundle whose DAG couldn't be built by bundle_dags.py
+check_dags(os.path.join(os.path.dirname(os.path.abspath(__file__)), DAG_FACTORY_FAILURES_FILE_NAME))
+"""
+
+
+def get_operator(module, operator):
+    return getattr(importlib.import_module(module), operator)
+
+
+def parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() == "true"
+    return bool(value)
+
+
+def build_dag(dataset_configs, lazy_imports=False):
+    """
+    Builds the DAG object of a dataset from the task specs DagGenerator renders modules from,
+    without rendering or parsing a module.
+
+    :param dataset_configs: Dataset configs as read by ConfigReader
+    :param lazy_imports: Build LazyOperator tasks, importing the operator modules only when tasks execute
+    :return: airflow DAG
+    """
+    from airflow import DAG
+    from airflow.operators.empty import EmptyOperator
+
+    dag_generator = DagGenerator(None, dataset_configs["dataset_name"], lazy_imports=lazy_imports)
+    dag_params = dag_generator.get_dag_params(dataset_configs)
+    with DAG(
+            dag_id=dag_params["dag_id"],
+            default_args=DAG_DEFAULT_ARGS,
+            description=dag_params["description"],
+            # No schedule, triggered manually
+            schedule=None if dag_params["schedule"] in ("None", "") else dag_params["schedule"],
+            start_date=datetime(*[int(part) for part in str(dag_params["start_date"]).split(",")]),
+            max_active_runs=dag_params["max_active_runs"],
+            catchup=parse_flag(dag_params["catchup"]),
+    ) as dag:
+        previous_task = EmptyOperator(task_id="start")
+        for task_spec in dag_generator.get_task_specs(dataset_configs):
+            task = get_operator(task_spec["module"], task_spec["operator"])(**task_spec["arguments"])
+            previous_task >> task
+            previous_task = task
+        previous_task >> EmptyOperator(task_id="end")
+
+    return dag
+
+
+def build_dags(bundle_path, run_date=None, lazy_imports=False, failures=None):
+    """
+    Builds the DAG of every dataset in a config bundle. A dataset whose DAG can't be built is logged and left out,
+    the other DAGs still load.
+
+    :param bundle_path: Path to the config bundle
+    :param run_date: Date (YYYY-MM-DD) the mirror version is picked for, defaults to today
+    :param lazy_imports: Build LazyOperator tasks, importing the operator modules only when tasks execute
+    :param failures: dict the error of every dataset whose DAG failed to build is added to, by dataset name
+    :return: dict of dag_id -> DAG
+    """
+    bundle = load_config_bundle(bundle_path)
+    failures = {} if failures is None else failures
+    dags = {}
+    for dataset_name in bundle.dataset_names():
+        try:
+            dataset_configs = ConfigReader(dataset_name, dataset_name, run_date=run_date, bundle=bundle).read_configs()
+            # Snowpipe datasets have no DAG
+            if not dataset_configs.get("tasks"):
+                continue
+            dag = build_dag(dataset_configs, lazy_imports=lazy_imports)
+            dags[dag.dag_id] = dag
+        except Exception as e:
+            logging.error(f"Failed to build the DAG of {dataset_name}: {e}")
+            failures[dataset_name] = f"{type(e).__name__}: {e}"
+
+    logging.info(f"Built {len(dags)} DAGs from {bundle_path} ({bundle.content_hash[:12]}), {len(failures)} failed")
+    return dags
+
+
+def register_dags(bundle_path, namespace, run_date=None, lazy_imports=False):
+    """
+    Builds the DAGs of a config bundle into namespace, usually the globals() of a module in the DAGs folder,
+    where the DagBag picks them up. The datasets whose DAG failed to build are recorded next to the module,
+    for check_dags to report.
+    """
+    failures = {}
+    dags = build_dags(bundle_path, run_date=run_date, lazy_imports=lazy_imports, failures=failures)
+    namespace.update(dags)
+    if namespace.get("__file__"):
+        failures_path = os.path.join(os.path.dirname(os.path.abspath(namespace["__file__"])),
+                                     DAG_FACTORY_FAILURES_FILE_NAME)
+        try:
+            write_if_changed(json.dumps(failures, indent=2, sort_keys=True), failures_path)
+        except OSError as e:
+            logging.warning(f"Failed to record the DAG build failures in {failures_path}: {e}")
+    return dags
+
+
+def check_dags(failures_path):
+    """
+    Raises listing the datasets whose DAG failed to build in the last register_dags, so they show as an import
+    error of the module calling it instead of disappearing. Reads the recorded failures, nothing is built.
+
+    :param failures_path: Failures file written by register_dags
+    :raises RuntimeError: When any DAG failed to build
+    """
+    if not os.path.exists(failures_path):
+        return
+    with open(failures_path, 'r') as file:
+        failures = json.load(file)
+    if failures:
+        raise RuntimeError(f"Failed to build the DAGs of {len(failures)} datasets:\n" +
+                           "\n".join(f"{dataset_name}: {error}" for dataset_name, error in sorted(failures.items())))
+
+
+def write_factory_module(dags_dir, bundle_path, sink=None, report=None, lazy_imports=False):
+    """
+    Writes the one module which builds the DAG of every dataset from the config bundle at runtime, and the module
+    which reports the datasets whose DAG fails to build as its import error.
+
+    :param dags_dir: Directory the modules are written to, e.g. generated_dags_ddls
+    :param bundle_path: Path to the config bundle as the scheduler sees it
+    :param lazy_imports: Build LazyOperator tasks, importing the operator modules only when tasks execute
+    :return: Path to the module
+    """
+    factory_module_path = os.path.join(dags_dir, DAG_FACTORY_FILE_NAME)
+    write_to_file(dag_factory_template.format(bundle_path=bundle_path, lazy_imports=lazy_imports),
+                  factory_module_path, report=report, sink=sink)
+    write_to_file(dag_factory_errors_template.format(bundle_path=bundle_path, lazy_imports=lazy_imports),
+                  os.path.join(dags_dir, DAG_FACTORY_ERRORS_FILE_NAME), report=report, sink=sink)
+    return factory_module_path
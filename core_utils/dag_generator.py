@@ -1,81 +1,130 @@
 import os
-from pathlib import Path
 import logging
 
 from constants.constants import default_args, dag_template
 from core_utils.config_reader import ConfigReader
-from core_utils.constants import mirror_file_meta_cols
-from core_utils.file_utils import write_to_file
+from core_utils.constants import mirror_file_meta_cols, dag_task_operators
+from core_utils.file_utils import write_to_file, GenerationReport, GENERATED_FILES_MANIFEST
+from core_utils.output_sinks import FileSystemSink
 
 
 class DagGenerator:
 
-    def __init__(self, configs_dir, dataset_name):
+    def __init__(self, configs_dir, dataset_name, sink=None, bundle=None, dag_mode="module", lazy_imports=False):
         self.configs_dir = configs_dir
         self.dataset_name = dataset_name
-
-    def generate_dag(self, dataset_configs, dag_template):
+        # OutputSink the configs are read from and the DAG and DDLs are written to, defaults to the file system
+        self.sink = sink or FileSystemSink()
+        # Compiled config bundle (ConfigBundle or its path) the configs are read from instead
+        self.bundle = bundle
+        # module renders a DAG module per dataset, factory leaves the DAG to the dag_factory module built from
+        # the config bundle and only generates the DDLs
+        if dag_mode not in ("module", "factory"):
+            raise ValueError(f"Unsupported dag_mode {dag_mode}, expected module or factory")
+        self.dag_mode = dag_mode
+        # Tasks are LazyOperators which import their operator module when they execute, not when the DAG is parsed
+        self.lazy_imports = lazy_imports
+
+    def get_task_values(self, dataset_configs):
+        """
+        Values the operator arguments of the dataset's tasks are taken from, see dag_task_operators.
+        """
         mirror_db, mirror_schema = dataset_configs["mirror_layer"]["database"], dataset_configs["mirror_layer"][
             "schema"]
+        mirror_configs = dataset_configs["mirror"][dataset_configs["mirror_version"]]
+        datetime_format = mirror_configs.get("datetime_pattern", "").upper().replace("YYYY", "%Y").replace(
+            "MM", "%m").replace("DD", "%d")
 
         # Handle optional s3_connection_id and bucket
-        if dataset_configs.get("bucket") is None:
-            dataset_configs["bucket"] = None
-            dataset_configs["s3_connection_id"] = None
+        bucket = dataset_configs.get("bucket")
+        return {
+            "s3_conn_id": None if bucket is None or dataset_configs.get("s3_connection_id") is None
+            else f'{dataset_configs["s3_connection_id"]}',
+            "bucket_name": None if bucket is None else f"{bucket}",
+            "db_conn_id": f'{dataset_configs.get("db_conn_id")}',
+            "configs_path": "/opt/airflow/configs/" if bucket is None else "dev/configs/",
+            "dataset_name": f'{dataset_configs["dataset_name"]}',
+            "dataset_dir": f'{mirror_configs["file_path"]}',
+            "file_name_pattern": f'{mirror_configs["file_name_pattern"]}',
+            "datetime_pattern": datetime_format,
+            "file_datetime_pattern": mirror_configs.get("datetime_pattern", "").upper(),
+            "encoding": f'{mirror_configs.get("encoding")}',
+            "stage_name": f'{mirror_db}.{mirror_schema}.{dataset_configs.get("snowflake_stage_name")}',
+            "table_name": f'{mirror_db}.{mirror_schema}.{mirror_configs["table_name"]}_TR',
+            "file_format_params": mirror_configs.get("file_format_params"),
+        }
+
+    def get_task_specs(self, dataset_configs):
+        """
+        Describes the tasks of the dataset's DAG in order, as the operator to import and the arguments to build it
+        with. generate_dag renders them into a module, dag_factory builds the operators from them directly.
+        With lazy_imports every task is a LazyOperator wrapping the operator's module, class and arguments.
 
+        :param dataset_configs: Dataset configs as read by ConfigReader
+        :return: List of dicts with task_name, module, operator and arguments
+        """
+        values = self.get_task_values(dataset_configs)
+        task_specs = []
         for task in dataset_configs["tasks"]:
-            if task == "acq_task":
-                dag_template += "from operators.acquisition_operator import AcquisitionOperator" + "\n"
-            elif task == "download_task":
-                dag_template += "from operators.download_operator import DownloadOperator" + "\n"
-            elif task == "move_to_snowflake_task":
-                dag_template += "from operators.move_file_to_snowflake_operator import MoveFileToSnowflakeOperator" + "\n"
-            elif task == "copy_to_snowflake_task":
-                dag_template += "from operators.snowflake_copy_operator import SnowflakeCopyOperator" + "\n"
-            elif task == "snowflake_mirror_task":
-                dag_template += "from operators.snowflake_load_to_mirror_operator import SnowflakeLoadToMirrorOperator" + "\n"
-            elif task == "snowflake_schema_check_task":
-                dag_template += "from operators.file_snowflake_table_schema_check_operator import FileSnowflakeTableSchemaCheckOperator" + "\n"
-            elif task == "snowflake_stage_task":
-                dag_template += "from operators.snowflake_load_to_stage_operator import SnowflakeLoadToStageOperator" + "\n"
-            elif task == "snowflake_file_mirror_data_check_task":
-                dag_template += "from operators.file_snowflake_table_data_check_operator import FileSnowflakeTableDataCheckOperator" + "\n"
-            elif task == "copy_to_postgres_task":
-                dag_template += "from operators.copy_file_to_postgres_operator import CopyFileToPostgresOperator" + "\n"
-            elif task == "postgres_mirror_task":
-                dag_template += "from operators.postgres_load_to_mirror_operator import PostgresLoadToMirrorOperator" + "\n"
-            elif task == "postgres_schema_check_task":
-                dag_template += "from operators.file_postgres_table_schema_check_operator import FilePostgresTableSchemaCheckOperator" + "\n"
-            elif task == "postgres_stage_task":
-                dag_template += "from operators.postgres_load_to_stage_operator import PostgresLoadToStageOperator" + "\n"
-            elif task == "postgres_file_mirror_data_check_task":
-                dag_template += "from operators.file_postgres_table_data_check_operator import FilePostgresTableDataCheckOperator" + "\n"
-            elif task == "snowflake_mirror_tests_task":
-                dag_template += "from operators.snowflake_mirror_tests_operator import SnowflakeMirrorTestsOperator" + "\n"
-            elif task == "snowflake_stage_tests_task":
-                dag_template += "from operators.snowflake_stage_tests_operator import SnowflakeStageTestsOperator" + "\n"
-
-            elif task == "postgres_mirror_tests_task":
-                dag_template += "from operators.postgres_mirror_tests_operator import PostgresMirrorTestsOperator" + "\n"
-            elif task == "postgres_stage_tests_task":
-                dag_template += "from operators.postgres_stage_tests_operator import PostgresStageTestsOperator" + "\n"
-
-        datetime_format = dataset_configs["mirror"]["v1"].get("datetime_pattern", "").upper().replace("YYYY",
-                                                                                                      "%Y").replace(
-            "MM", "%m").replace("DD", "%d")
+            if task not in dag_task_operators:
+                raise ValueError(f"Unknown task {task} in the configs of {dataset_configs['dataset_name']}")
+            module, operator, task_id, arguments = dag_task_operators[task]
+            if isinstance(task_id, tuple):
+                task_id = task_id[0] if values["bucket_name"] is None else task_id[1]
+
+            task_arguments = {"task_id": task_id}
+            for argument in arguments:
+                argument, value_name = argument if isinstance(argument, tuple) else (argument, argument)
+                task_arguments[argument] = values[value_name]
+            if self.lazy_imports:
+                task_arguments = {"task_id": task_arguments.pop("task_id"), "operator_module": module,
+                                  "operator_class": operator, "operator_kwargs": task_arguments}
+                module, operator = "core_utils.lazy_operator", "LazyOperator"
+            task_specs.append({"task_name": task, "module": module, "operator": operator,
+                               "arguments": task_arguments})
+        return task_specs
+
+    def get_dag_params(self, dataset_configs):
+        """
+        Arguments of the dataset's DAG, with start_date as written in the configs (e.g. 2024,1,1).
+        """
+        return {
+            "dag_id": f'{dataset_configs["dataset_name"]}_dag',
+            "description": "A simple DAG with a Data ingestion",
+            "schedule": f'{dataset_configs.get("schedule_interval")}',
+            "start_date": dataset_configs["start_date"],
+            "max_active_runs": 1,
+            "catchup": dataset_configs.get("load_historical_data"),
+        }
+
+    @staticmethod
+    def render_argument(argument, value):
+        if isinstance(value, str):
+            # Paths are written as raw strings
+            return f'r"{value}"' if argument == "dataset_dir" else f'"{value}"'
+        return f"{value}"
+
+    def generate_dag(self, dataset_configs, dag_template):
+        task_specs = self.get_task_specs(dataset_configs)
+        dag_params = self.get_dag_params(dataset_configs)
+
+        # LazyOperator tasks share one import
+        for import_line in dict.fromkeys(f"from {task_spec['module']} import {task_spec['operator']}"
+                                         for task_spec in task_specs):
+            dag_template += import_line + "\n"
 
         dag_template += default_args
 
         dag_body = f"""
 # Define the DAG 
 with DAG(
-    dag_id="{dataset_configs["dataset_name"]}_dag",
+    dag_id="{dag_params["dag_id"]}",
     default_args=default_args,
-    description="A simple DAG with a Data ingestion",
-    schedule="{dataset_configs["schedule_interval"]}",  # No schedule, triggered manually
-    start_date=datetime({dataset_configs["start_date"]}),
-    max_active_runs=1 ,
-    catchup={dataset_configs["load_historical_data"]},
+    description="{dag_params["description"]}",
+    schedule="{dag_params["schedule"]}",  # No schedule, triggered manually
+    start_date=datetime({dag_params["start_date"]}),
+    max_active_runs={dag_params["max_active_runs"]} ,
+    catchup={dag_params["catchup"]},
         ) as dag:
 
         start = EmptyOperator(
@@ -91,213 +140,12 @@ with DAG(
         """
 
         dag_template += dag_body
-        if "acq_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-         # Task 1: Using the AcquisitionOperator
-        acq_task = AcquisitionOperator(
-            task_id={f'"check_file_present"' if dataset_configs["bucket"] is None else f'"check_file_present_on_s3"'},
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            dataset_dir=r"{dataset_configs["mirror"]["v1"]["file_path"]}",
-            file_pattern="{dataset_configs["mirror"]["v1"]["file_name_pattern"]}",
-            datetime_pattern="{datetime_format}"
-        ) 
-            """
-        if "download_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        download_task = DownloadOperator(
-            task_id={f'"download_file_to_airflow_tmp_area"' if dataset_configs["bucket"] is None else f'"download_file_from_s3_to_airflow_tmp_area"'},
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            dataset_dir=r"{dataset_configs["mirror"]["v1"]["file_path"]}",
-            file_name="{dataset_configs["mirror"]["v1"]["file_name_pattern"]}",
-            datetime_pattern="{datetime_format}"
-        )
-            """
-        if "move_to_snowflake_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        move_to_snowflake_task = MoveFileToSnowflakeOperator(
-            task_id="move_file_to_snowflake_internal_stage",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            stage_name="{mirror_db}.{mirror_schema}.{dataset_configs["snowflake_stage_name"]}"
-        )
-            """
-        if "snowflake_schema_check_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_schema_check_task = FileSnowflakeTableSchemaCheckOperator(
-            task_id="check_schema_of_config_n_received_file",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}",
-            stage_name="{mirror_db}.{mirror_schema}.{dataset_configs["snowflake_stage_name"]}",
-            table_name="{mirror_db}.{mirror_schema}.{dataset_configs["mirror"]["v1"]["table_name"]}_TR"
-        )
-            """
-
-        if "postgres_schema_check_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_schema_check_task = FilePostgresTableSchemaCheckOperator(
-            task_id="check_schema_of_config_n_received_file",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}"
-        )
-            """
-
-        if "copy_to_snowflake_task" in dataset_configs["tasks"]:
+        for task_spec in task_specs:
+            arguments = ",\n".join(f"            {argument}={self.render_argument(argument, value)}"
+                                   for argument, value in task_spec["arguments"].items())
             dag_template += f"""
-        copy_to_snowflake_task = SnowflakeCopyOperator(
-            task_id="copy_data_from_internal_stage",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}",
-            stage_name="{mirror_db}.{mirror_schema}.{dataset_configs["snowflake_stage_name"]}",
-            table_name="{mirror_db}.{mirror_schema}.{dataset_configs["mirror"]["v1"]["table_name"]}_TR"
-        )
-            """
-
-        if "copy_to_postgres_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        copy_to_postgres_task = CopyFileToPostgresOperator(
-            task_id="copy_data_from_file_to_postgres",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}",            
-            table_name="{mirror_db}.{mirror_schema}.{dataset_configs["mirror"]["v1"]["table_name"]}_TR",
-            file_format_params={dataset_configs["mirror"]["v1"]["file_format_params"]},
-            datetime_pattern="{dataset_configs["mirror"]["v1"].get("datetime_pattern", "").upper()}"
-        )
-            """
-
-        if "snowflake_file_mirror_data_check_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_file_mirror_data_check_task = FileSnowflakeTableDataCheckOperator(
-            task_id="check_file_n_mirror_table_data",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}",
-            table_name="{mirror_db}.{mirror_schema}.{dataset_configs["mirror"]["v1"]["table_name"]}_TR"
-        )
-            """
-
-        if "postgres_file_mirror_data_check_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_file_mirror_data_check_task = FilePostgresTableDataCheckOperator(
-            task_id="check_file_n_mirror_table_data",
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}",
-            encoding="{dataset_configs["mirror"]["v1"]["encoding"]}",
-            table_name="{mirror_db}.{mirror_schema}.{dataset_configs["mirror"]["v1"]["table_name"]}_TR"
-        )
-            """
-
-        if "snowflake_mirror_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_mirror_task = SnowflakeLoadToMirrorOperator(
-            task_id="load_to_mirror_table",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "postgres_mirror_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_mirror_task = PostgresLoadToMirrorOperator(
-            task_id="load_to_mirror_table",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "postgres_mirror_tests_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_mirror_tests_task = PostgresMirrorTestsOperator(
-            task_id="mirror_data_tests",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "snowflake_mirror_tests_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_mirror_tests_task = SnowflakeMirrorTestsOperator(
-            task_id="mirror_data_tests",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "snowflake_stage_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_stage_task = SnowflakeLoadToStageOperator(
-            task_id="load_to_stage_table",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "postgres_stage_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_stage_task = PostgresLoadToStageOperator(
-            task_id="load_to_stage_table",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "snowflake_stage_tests_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        snowflake_stage_tests_task = SnowflakeStageTestsOperator(
-            task_id="stage_data_tests",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
-        )
-            """
-
-        if "postgres_stage_tests_task" in dataset_configs["tasks"]:
-            dag_template += f"""
-        postgres_stage_tests_task = PostgresStageTestsOperator(
-            task_id="stage_data_tests",
-            s3_conn_id={None if dataset_configs["s3_connection_id"] is None else f'"{dataset_configs["s3_connection_id"]}"'},
-            db_conn_id="{dataset_configs["db_conn_id"]}",
-            bucket_name={None if dataset_configs["bucket"] is None else f'"{dataset_configs["bucket"]}"'},
-            configs_path={f'"/opt/airflow/configs/"' if dataset_configs["bucket"] is None else f'"dev/configs/"'},
-            dataset_name="{dataset_configs["dataset_name"]}"
+        {task_spec["task_name"]} = {task_spec["operator"]}(
+{arguments}
         )
             """
 
@@ -347,38 +195,48 @@ with DAG(
 
         configs_root_dir = os.path.join(self.configs_dir, dataset_name)
 
-        dataset_configs = ConfigReader(configs_root_dir, dataset_name).read_configs()
-
-        dag_data = self.generate_dag(dataset_configs, dag_template)
+        dataset_configs = ConfigReader(configs_root_dir, dataset_name, sink=self.sink, bundle=self.bundle).read_configs()
 
         dag_gen_dir = os.path.join(self.configs_dir, "generated_dags_ddls")
-        Path(dag_gen_dir).mkdir(parents=True, exist_ok=True)
+        self.sink.makedirs(dag_gen_dir)
+
+        # Unchanged DAGs are not rewritten, so the scheduler doesn't re-parse them
+        report = GenerationReport()
 
-        write_to_file(dag_data, os.path.join(dag_gen_dir, dataset_name + "_dag.py"))
+        # A DAG module left from the module mode is removed as stale in the factory mode
+        if self.dag_mode == "module":
+            dag_data = self.generate_dag(dataset_configs, dag_template)
+            write_to_file(dag_data, os.path.join(dag_gen_dir, dataset_name + "_dag.py"), report=report,
+                          sink=self.sink)
 
         mirror_db, mirror_schema = dataset_configs["mirror_layer"]["database"], dataset_configs["mirror_layer"][
             "schema"]
-        table_name, table_schema = dataset_configs["mirror"]["v1"]["table_name"], dataset_configs["mirror"]["v1"][
-            "table_schema"]
+        mirror_configs = dataset_configs["mirror"][dataset_configs["mirror_version"]]
+        table_name, table_schema = mirror_configs["table_name"], mirror_configs["table_schema"]
 
         mirror_tr_ddls = self.generate_ddls(mirror_db, mirror_schema, f"{table_name}_TR", table_schema, "mirror", mirror_schema)
 
-        write_to_file(mirror_tr_ddls, os.path.join(dag_gen_dir, f"{table_name}_TR.sql"))
+        write_to_file(mirror_tr_ddls, os.path.join(dag_gen_dir, f"{table_name}_TR.sql"), report=report, sink=self.sink)
 
         mirror_ddls = self.generate_ddls(mirror_db, mirror_schema, table_name, table_schema, "mirror", mirror_schema)
 
-        write_to_file(mirror_ddls, os.path.join(dag_gen_dir, table_name + ".sql"))
+        write_to_file(mirror_ddls, os.path.join(dag_gen_dir, table_name + ".sql"), report=report, sink=self.sink)
 
         stage_db, stage_schema = dataset_configs["stage_layer"]["database"], dataset_configs["stage_layer"]["schema"]
-        table_name, table_schema = dataset_configs["stage"]["v1"]["table_name"], dataset_configs["stage"]["v1"][
-            "table_schema"]
+        stage_configs = dataset_configs["stage"][dataset_configs["stage_version"]]
+        table_name, table_schema = stage_configs["table_name"], stage_configs["table_schema"]
 
         stage_ddls = self.generate_ddls(stage_db, stage_schema, table_name, table_schema, "stage", stage_schema)
 
-        write_to_file(stage_ddls, os.path.join(dag_gen_dir, table_name + ".sql"))
+        write_to_file(stage_ddls, os.path.join(dag_gen_dir, table_name + ".sql"), report=report, sink=self.sink)
 
         stage_sql = f""" CREATE STAGE IF NOT EXISTS  {mirror_db}.{mirror_schema}.{dataset_configs["snowflake_stage_name"]} ;"""
 
-        write_to_file(stage_sql, os.path.join(dag_gen_dir, dataset_configs["snowflake_stage_name"] + ".sql"))
+        write_to_file(stage_sql, os.path.join(dag_gen_dir, dataset_configs["snowflake_stage_name"] + ".sql"),
+                      report=report, sink=self.sink)
 
+        report.remove_stale_outputs(os.path.join(dag_gen_dir, f".{dataset_name}{GENERATED_FILES_MANIFEST}"),
+                                    sink=self.sink)
+        logging.info(f"Generated DAG and DDLs for {dataset_name}: {report.summary()}")
 
+        return report
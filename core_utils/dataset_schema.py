@@ -0,0 +1,167 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from core_utils.file_profile import build_file_profile
+from core_utils.file_utils import classify_file_names, get_column_data_types, ColumnTypeStats, is_s3_uri
+from core_utils.profile_cache import ProfileCache
+
+
+@dataclass
+class DatasetSchema:
+    """
+    Schema inferred over a sample of the files of a dataset, with the files which disagreed with it.
+    """
+    columns: List[str]
+    data_types: Dict
+    files: List[str]
+    optional_columns: List[str] = field(default_factory=list)
+    # Per file: missing_columns, reordered, null_only_columns and type_differences
+    disagreements: Dict = field(default_factory=dict)
+    failed_files: Dict = field(default_factory=dict)
+
+
+def list_dataset_files(dataset_path):
+    """
+    Lists the files under a local dataset directory, or the objects under an s3://bucket/prefix/ as s3:// URIs,
+    skipping hidden files.
+    """
+    if is_s3_uri(dataset_path):
+        from core_utils.s3_utils import get_s3_client, list_prefix, parse_s3_uri, S3_CONN_ID_ENV
+
+        bucket_name, prefix = parse_s3_uri(dataset_path)
+        return sorted(f"s3://{bucket_name}/{obj['Key']}"
+                      for obj in list_prefix(get_s3_client(os.getenv(S3_CONN_ID_ENV)), bucket_name, prefix)
+                      if not any(part.startswith(".") for part in obj['Key'][len(prefix):].split("/")))
+
+    file_paths = []
+    for root, dirs, files in os.walk(dataset_path):
+        dirs[:] = [dir_name for dir_name in dirs if not dir_name.startswith(".")]
+        file_paths.extend(os.path.join(root, file_name) for file_name in files if not file_name.startswith("."))
+    return sorted(file_paths)
+
+
+def select_stratified_sample(file_paths, sample_size=12, file_date_format=None):
+    """
+    Picks up to sample_size files spread across the dates in their names. Files are grouped by month and
+    months take turns, newest file first, so every month is represented before any month gets a second file.
+    When there are more months than files to pick, evenly spaced months are picked from.
+    Files without a date in their name are taken last.
+
+    :param file_paths: File paths or object keys of the dataset
+    :param sample_size: Number of files to pick
+    :param file_date_format: Date format of the file names (e.g. YYYY-MM-DD), detected when not given
+    :return: Sampled file paths, oldest first
+    """
+    months, undated_files = {}, []
+    for classified in classify_file_names(file_paths, file_date_format).values():
+        undated_files.extend(classified["undated_files"])
+        for file_date, files in classified["files"].items():
+            months.setdefault((file_date.year, file_date.month), []).extend((file_date, file) for file in files)
+
+    strata = [sorted(files, reverse=True) for _, files in sorted(months.items())]
+    # With more months than files to pick, the months are spread evenly over the whole date range
+    if 1 < sample_size < len(strata):
+        strata = [strata[round(index * (len(strata) - 1) / (sample_size - 1))] for index in range(sample_size)]
+    sample = []
+    while len(sample) < sample_size and any(strata):
+        for stratum in strata:
+            if stratum and len(sample) < sample_size:
+                sample.append(stratum.pop(0))
+
+    sample = [file for _, file in sorted(sample)]
+    return sample + sorted(undated_files)[:sample_size - len(sample)]
+
+
+def get_base_type(db_type):
+    return db_type.split("(")[0]
+
+
+def profile_sample_file(file_path, profile_params, cache_path=None):
+    if cache_path:
+        return ProfileCache(cache_path).get_file_profile(file_path, **profile_params)
+    return build_file_profile(file_path, **profile_params)
+
+
+def infer_dataset_schema(dataset_path, sample_size=12, file_date_format=None, max_workers=None, cache_path=None,
+                         **profile_params):
+    """
+    Infers one schema over a stratified sample of the files under dataset_path. The sampled files are profiled
+    in parallel and the type statistics of every column are merged, so types widen to hold the values of every
+    file, columns missing from some files become optional and files with a column entirely null don't narrow it.
+    Parquet and Arrow files carry their types, a column takes the type of the newest file holding it.
+
+    :param dataset_path: Local dataset directory, s3://bucket/prefix/ of the dataset, or a list of file paths
+    :param sample_size: Number of files profiled
+    :param file_date_format: Date format of the file names (e.g. YYYY-MM-DD), detected when not given
+    :param max_workers: Number of profiling processes, defaults to the number of CPUs
+    :param cache_path: ProfileCache database reused across runs
+    :param profile_params: Keyword arguments of build_file_profile
+    :return: DatasetSchema
+    """
+    file_paths = dataset_path if isinstance(dataset_path, list) else list_dataset_files(dataset_path)
+    sample = select_stratified_sample(file_paths, sample_size=sample_size, file_date_format=file_date_format)
+    if not sample:
+        raise ValueError(f"No files found to infer the schema of {dataset_path}")
+    logging.info(f"Inferring schema from {len(sample)} of {len(file_paths)} files")
+
+    profiles, failed_files = {}, {}
+    with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(sample))) as executor:
+        futures = {executor.submit(profile_sample_file, file_path, profile_params, cache_path): file_path
+                   for file_path in sample}
+        for future in as_completed(futures):
+            try:
+                profiles[futures[future]] = future.result()
+            except Exception as e:
+                logging.error(f"Failed to profile {futures[future]}: {e}")
+                failed_files[futures[future]] = f"{type(e).__name__}: {e}"
+
+    files = [file_path for file_path in sample if file_path in profiles]
+    if not files:
+        raise ValueError(f"None of the sampled files of {dataset_path} could be profiled")
+
+    # Column order follows the newest file, columns only found in older files are appended
+    columns = []
+    for file_path in reversed(files):
+        columns.extend(column for column in profiles[file_path].columns if column not in columns)
+
+    merged_stats, data_types = {}, {}
+    for file_path in files:
+        file_profile = profiles[file_path]
+        for column in file_profile.columns:
+            if column in file_profile.column_stats:
+                merged_stats.setdefault(column, ColumnTypeStats()).merge(file_profile.column_stats[column])
+            else:
+                data_types[column] = file_profile.data_types[column]
+    precise_types = profile_params.get("precise_types", False)
+    # Files outside the sample may hold longer values, widths aren't sized from the sample
+    data_types.update(get_column_data_types(merged_stats, precise_types=precise_types, sized_types=False))
+    data_types = {column: data_types[column] for column in columns}
+
+    disagreements = {}
+    for file_path in files:
+        file_profile = profiles[file_path]
+        file_columns = [column for column in columns if column in file_profile.columns]
+        null_only_columns = [column for column, stats in file_profile.column_stats.items()
+                             if stats.pandas_dtype is None]
+        disagreement = {
+            "missing_columns": [column for column in columns if column not in file_profile.columns],
+            "reordered": file_columns != list(file_profile.columns),
+            "null_only_columns": null_only_columns,
+            # Widths and precisions always vary between files, only different kinds of type are reported
+            "type_differences": {column: [file_profile.data_types[column]["snowflake_dtype"],
+                                          data_types[column]["snowflake_dtype"]]
+                                 for column in file_profile.columns if column not in null_only_columns
+                                 and get_base_type(file_profile.data_types[column]["snowflake_dtype"]) !=
+                                 get_base_type(data_types[column]["snowflake_dtype"])}
+        }
+        if any(disagreement.values()):
+            disagreements[file_path] = disagreement
+
+    optional_columns = [column for column in columns if any(column not in profiles[file_path].columns
+                                                            for file_path in files)]
+    logging.info(f"Inferred schema of {len(columns)} columns, {len(disagreements)} files disagreed")
+    return DatasetSchema(columns=columns, data_types=data_types, files=files, optional_columns=optional_columns,
+                         disagreements=disagreements, failed_files=failed_files)
@@ -1,17 +1,26 @@
 import json
 import os
-from pathlib import Path
+from io import StringIO
 import logging
 from ruamel.yaml import YAML
 
+from core_utils.file_utils import GenerationReport, GENERATED_FILES_MANIFEST
+from core_utils.output_sinks import FileSystemSink
+
 
 class DBTMirrorModel():
-    def __init__(self, configs, layer, db_type, materialization="incremental", scd_config=None):
+    def __init__(self, configs, layer, db_type, materialization="incremental", scd_config=None, output_dir=None,
+                 sink=None):
         self.configs = configs
         self.layer = layer
         self.db_type = db_type
         self.materialization = materialization
         self.scd_config = scd_config or {}
+        # dbt project dir the models are generated under, defaults to the working directory
+        self.output_dir = output_dir
+        # OutputSink the models are written to, defaults to the file system
+        self.sink = sink or FileSystemSink()
+        self.report = GenerationReport()
 
     def generate_mirror_model(self, table_name, model_path, materialization, dataset_name, unique_key, schema,
                               database):
@@ -84,9 +93,8 @@ WITH {dataset_name} AS (
 SELECT *
 FROM {dataset_name}
     """
-            # Write the SQL content to the output file
-            with open(model_path, 'w', encoding='utf-8') as sql_file:
-                sql_file.write(sql_content.strip())
+            # Write the SQL content to the output file, unless it is unchanged
+            self.report.record(model_path, self.sink.write(model_path, sql_content.strip()))
 
             logging.info(f"Successfully generated dbt model SQL at {model_path}")
         except Exception as e:
@@ -106,9 +114,10 @@ FROM {dataset_name}
             yaml = YAML()
             yaml.default_flow_style = False
 
-            # Write to the YAML file
-            with open(yaml_file_path, 'w', encoding='utf-8') as yaml_file:
-                yaml.dump(json_data, yaml_file)
+            # Write to the YAML file, unless it is unchanged
+            yaml_content = StringIO()
+            yaml.dump(json_data, yaml_content)
+            self.report.record(yaml_file_path, self.sink.write(yaml_file_path, yaml_content.getvalue()))
 
             logging.info(f"Successfully converted json data to {yaml_file_path} with preserved order.")
         except Exception as e:
@@ -357,9 +366,8 @@ FROM {dataset_name}
 
             sql_content = sql_content + "\n" + with_query
 
-            # Write the SQL content to the output file
-            with open(model_path, 'w', encoding='utf-8') as sql_file:
-                sql_file.write(sql_content.strip())
+            # Write the SQL content to the output file, unless it is unchanged
+            self.report.record(model_path, self.sink.write(model_path, sql_content.strip()))
 
             logging.info(f"Successfully generated dbt model SQL at {model_path}")
         except Exception as e:
@@ -367,11 +375,12 @@ FROM {dataset_name}
             raise
 
     def generate(self):
+        self.report = GenerationReport()
 
-        current_dir = os.getcwd()
-        models_path = os.path.join(current_dir, "dbt", "models")
+        output_dir = self.output_dir or os.getcwd()
+        models_path = os.path.join(output_dir, "dbt", "models")
 
-        Path(models_path).mkdir(exist_ok=True, parents=True)
+        self.sink.makedirs(models_path)
         
         if not self.configs:
             logging.error("Configs dictionary is empty")
@@ -410,7 +419,7 @@ FROM {dataset_name}
 
         if self.layer == "mirror":
             mirror_dir = os.path.join(models_path, "mirror", dataset_name)
-            Path(mirror_dir).mkdir(exist_ok=True, parents=True)
+            self.sink.makedirs(mirror_dir)
 
             mirror_table = mirror_configs["table_name"]
             unique_keys = mirror_configs["unique_keys"]
@@ -427,6 +436,8 @@ FROM {dataset_name}
                                        schema=mirror_configs["schema"],
                                        unique_key=unique_keys)
 
+            self.report.remove_stale_outputs(os.path.join(mirror_dir, GENERATED_FILES_MANIFEST), sink=self.sink)
+
         elif self.layer == "stage":
 
             mirror_table = mirror_configs["table_name"]
@@ -435,7 +446,7 @@ FROM {dataset_name}
 
             stage_dir = os.path.join(models_path, "stage", dataset_name)
 
-            Path(stage_dir).mkdir(exist_ok=True, parents=True)
+            self.sink.makedirs(stage_dir)
 
             stage_configs = self.configs[dataset_name]["stage"]
 
@@ -461,4 +472,7 @@ FROM {dataset_name}
                                        mirror_schema=mirror_configs["schema"],
                                        db_type=self.db_type)
 
+            self.report.remove_stale_outputs(os.path.join(stage_dir, GENERATED_FILES_MANIFEST), sink=self.sink)
 
+        logging.info(f"Generated dbt {self.layer} models for {dataset_name}: {self.report.summary()}")
+        return self.report
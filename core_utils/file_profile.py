@@ -0,0 +1,314 @@
+import csv
+import io
+import logging
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core_utils.file_utils import sniff_file_format, ColumnTypeStats, get_column_data_types, get_column_hashes, \
+    find_unique_keys, detect_compression, detect_file_type, get_arrow_data_types, read_csv_chunks, open_input, \
+    is_s3_uri, open_raw
+
+
+@dataclass
+class FileProfile:
+    """
+    Everything config generation needs to know about a file, built from a single parse of it.
+    """
+    file_path: str
+    file_type: str
+    delimiter: Optional[str]
+    quote_char: Optional[str]
+    line_terminator: Optional[str]
+    compression: str
+    columns: List[str]
+    header: List[str]
+    data_types: Dict
+    null_rates: Dict = field(default_factory=dict)
+    distinct_counts: Dict = field(default_factory=dict)
+    unique_keys: List[str] = field(default_factory=list)
+    row_count: int = 0
+    # ColumnTypeStats per column of delimited files, used to merge the types of several files
+    column_stats: Dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, profile):
+        profile = dict(profile)
+        profile["column_stats"] = {column: ColumnTypeStats(**stats)
+                                   for column, stats in profile.get("column_stats", {}).items()}
+        return cls(**profile)
+
+
+def build_file_profile(file_path, full_scan=False, lines_to_read=5000, chunk_size=100000, engine=None,
+                       precise_types=False):
+    """
+    Profiles a file with one parse. Parquet and Arrow IPC files are handed to build_columnar_profile.
+
+    Delimited files: the format is sniffed from the raw bytes, then the rows are parsed
+    once with the sniffed delimiter and every statistic is computed from that parse. Compressed files are
+    decompressed while streaming.
+
+    Data types and null rates cover the first lines_to_read rows, or the whole file with full_scan.
+    Distinct counts and candidate keys are computed from the first lines_to_read rows.
+
+    :param file_path: Path to the file
+    :param full_scan: Walk the whole file in chunks of chunk_size rows while inferring data types
+    :param lines_to_read: Number of rows sampled for keys, and for data types when full_scan is off
+    :param chunk_size: Number of rows parsed at a time in full scan mode
+    :param engine: Parse engine for delimited files, pandas or pyarrow, see get_parse_engine
+    :param precise_types: Detect dates, timestamps, decimals and string widths of delimited files,
+                          columnar files always carry precise types. Widths are only sized with full_scan
+    :return: FileProfile
+    """
+    file_type = detect_file_type(file_path)
+    if file_type != "CSV":
+        return build_columnar_profile(file_path, file_type, lines_to_read=lines_to_read)
+
+    compression = detect_compression(file_path)
+    sniffed_format = sniff_file_format(file_path, compression=compression)
+    logging.info(f"Identified file format: {sniffed_format}, compression: {compression}")
+
+    column_stats = {}
+    key_sample_chunks, key_sample_rows = [], 0
+    for chunk in read_csv_chunks(file_path, delimiter=sniffed_format["delimiter"],
+                                 quote_char=sniffed_format["quote_char"], chunk_size=chunk_size,
+                                 nrows=None if full_scan else lines_to_read, engine=engine,
+                                 line_terminator=sniffed_format["line_terminator"], compression=compression):
+        if key_sample_rows < lines_to_read:
+            key_sample_chunks.append(chunk.head(lines_to_read - key_sample_rows))
+            key_sample_rows += len(key_sample_chunks[-1])
+        for column in chunk.columns:
+            column_stats.setdefault(column, ColumnTypeStats()).update(chunk[column])
+    # A header only file may not yield any chunk, profile its header columns with an empty sample then
+    key_sample = pd.concat(key_sample_chunks) if key_sample_chunks else \
+        pd.DataFrame(columns=read_file_header(file_path))
+    for column in key_sample.columns:
+        column_stats.setdefault(column, ColumnTypeStats())
+
+    columns = list(column_stats)
+    column_hashes = get_column_hashes(key_sample)
+    distinct_counts = {column: len(np.unique(hashes)) for column, hashes in column_hashes.items()}
+    unique_keys = find_unique_keys(key_sample, column_hashes=column_hashes)
+
+    return FileProfile(file_path=file_path,
+                       file_type=file_type,
+                       delimiter=sniffed_format["delimiter"],
+                       quote_char=sniffed_format["quote_char"],
+                       line_terminator=sniffed_format["line_terminator"],
+                       compression=compression,
+                       columns=columns,
+                       header=[col.replace(" ", "_").upper() for col in columns],
+                       # Sizes of the first rows would fail on the first longer value further down the file
+                       data_types=get_column_data_types(column_stats, precise_types=precise_types,
+                                                        sized_types=full_scan),
+                       null_rates={column: stats.null_count / stats.row_count if stats.row_count else 0.0
+                                   for column, stats in column_stats.items()},
+                       distinct_counts=distinct_counts,
+                       unique_keys=[col.replace(" ", "_").upper() for col in unique_keys],
+                       row_count=max((stats.row_count for stats in column_stats.values()), default=0),
+                       column_stats=column_stats)
+
+
+def open_columnar(file_path, block_size=None):
+    """
+    Memory maps a local Parquet or Arrow IPC file. S3 objects can't be mapped, they are read through ranged reads
+    of block_size so only the footer, schema, Arrow IPC message headers and the sampled row groups or batches
+    are fetched.
+    """
+    import pyarrow as pa
+
+    if is_s3_uri(file_path):
+        from core_utils.s3_utils import open_s3_object
+
+        return pa.PythonFile(open_s3_object(file_path, block_size=block_size), mode='r')
+    return pa.memory_map(file_path, 'r')
+
+
+# Arrow IPC file layout, https://arrow.apache.org/docs/format/Columnar.html#ipc-file-format
+ARROW_IPC_MAGIC = b"ARROW1"
+ARROW_IPC_CONTINUATION = b"\xff\xff\xff\xff"
+# Footer and message headers are small and spread over the file, S3 ranges of this size keep batch bodies out
+ARROW_IPC_METADATA_BLOCK_SIZE = 64 * 1024
+
+
+def get_flatbuffer_field(buffer, table_position, field_index):
+    """
+    Returns the position of a field of a flatbuffer table, or None when the field isn't set.
+    """
+    vtable_position = table_position - struct.unpack_from("<i", buffer, table_position)[0]
+    vtable_size = struct.unpack_from("<H", buffer, vtable_position)[0]
+    entry = 4 + 2 * field_index
+    if entry >= vtable_size:
+        return None
+    field_offset = struct.unpack_from("<H", buffer, vtable_position + entry)[0]
+    return table_position + field_offset if field_offset else None
+
+
+def get_flatbuffer_vector(buffer, table_position, field_index):
+    """
+    Returns the position of the first element and the length of a vector field of a flatbuffer table.
+    """
+    field_position = get_flatbuffer_field(buffer, table_position, field_index)
+    if field_position is None:
+        return None, 0
+    vector_position = field_position + struct.unpack_from("<I", buffer, field_position)[0]
+    return vector_position + 4, struct.unpack_from("<I", buffer, vector_position)[0]
+
+
+def count_field_nodes(arrow_type):
+    # Record batches hold one field node per field, children included, depth first
+    return 1 + sum(count_field_nodes(arrow_type.field(index).type) for index in range(arrow_type.num_fields))
+
+
+def read_arrow_ipc_counts(source, schema):
+    """
+    Reads the row count and the null count of every column of an Arrow IPC file from its footer and the headers
+    of its record batch messages, no record batch body is read.
+
+    :param source: Seekable binary file of the Arrow IPC file
+    :param schema: Schema of the file, maps the field nodes of the record batches to columns
+    :return: Row count and dict of column -> null count
+    """
+    source.seek(-len(ARROW_IPC_MAGIC) - 4, io.SEEK_END)
+    footer_length = struct.unpack("<i", source.read(4))[0]
+    source.seek(-len(ARROW_IPC_MAGIC) - 4 - footer_length, io.SEEK_END)
+    footer = source.read(footer_length)
+    # Footer table fields: version, schema, dictionaries, recordBatches
+    blocks_position, block_count = get_flatbuffer_vector(footer, struct.unpack_from("<I", footer, 0)[0], 3)
+
+    node_indexes, node_index = [], 0
+    for arrow_field in schema:
+        node_indexes.append(node_index)
+        node_index += count_field_nodes(arrow_field.type)
+
+    row_count, null_counts = 0, {column: 0 for column in schema.names}
+    for block_index in range(block_count):
+        # Block struct: offset, metaDataLength, padding, bodyLength
+        offset, metadata_length = struct.unpack_from("<qi", footer, blocks_position + 24 * block_index)
+        source.seek(offset)
+        metadata = source.read(metadata_length)
+        # Messages start with a continuation marker and the metadata size, older writers leave the marker out
+        message = metadata[8:] if metadata.startswith(ARROW_IPC_CONTINUATION) else metadata[4:]
+        # Message table fields: version, header_type, header, bodyLength. RecordBatch: length, nodes, buffers
+        message_table = struct.unpack_from("<I", message, 0)[0]
+        header_position = get_flatbuffer_field(message, message_table, 2)
+        record_batch_table = header_position + struct.unpack_from("<I", message, header_position)[0]
+        length_position = get_flatbuffer_field(message, record_batch_table, 0)
+        if length_position is not None:
+            row_count += struct.unpack_from("<q", message, length_position)[0]
+        nodes_position, _ = get_flatbuffer_vector(message, record_batch_table, 1)
+        # FieldNode struct: length, null_count
+        for column, column_node_index in zip(schema.names, node_indexes):
+            null_counts[column] += struct.unpack_from("<q", message, nodes_position + 16 * column_node_index + 8)[0]
+    return row_count, null_counts
+
+
+def build_columnar_profile(file_path, file_type, lines_to_read=5000):
+    """
+    Profiles a Parquet or Arrow IPC file. Column types and row count come from the schema in the file metadata,
+    so no data is parsed for them. Null counts come from the Parquet row group statistics when they are written,
+    and from the record batch message headers of Arrow IPC files, whose batch bodies aren't read for them.
+    Distinct counts and candidate keys are computed from the first lines_to_read rows.
+
+    :param file_path: Path to the file
+    :param file_type: PARQUET or ARROW
+    :param lines_to_read: Number of rows sampled for keys
+    :return: FileProfile
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(f"pyarrow package is required to profile {file_type.lower()} file {file_path}")
+
+    null_counts = {}
+    if file_type == "PARQUET":
+        with open_columnar(file_path) as source:
+            parquet_file = pq.ParquetFile(source)
+            schema = parquet_file.schema_arrow
+            columns = schema.names
+            metadata = parquet_file.metadata
+            row_count = metadata.num_rows
+
+            for row_group_index in range(metadata.num_row_groups):
+                row_group = metadata.row_group(row_group_index)
+                for column_index in range(row_group.num_columns):
+                    column_chunk = row_group.column(column_index)
+                    column = column_chunk.path_in_schema
+                    # Nested columns are stored as several leaf columns, their null counts don't add up to
+                    # the column's
+                    if column not in columns:
+                        continue
+                    statistics = column_chunk.statistics
+                    if statistics is not None and statistics.has_null_count \
+                            and null_counts.get(column, 0) is not None:
+                        null_counts[column] = null_counts.get(column, 0) + statistics.null_count
+                    else:
+                        null_counts[column] = None
+
+            first_batch = next(parquet_file.iter_batches(batch_size=lines_to_read), None)
+            key_sample = first_batch.to_pandas() if first_batch is not None else pd.DataFrame(columns=columns)
+    else:
+        # Memory mapped (ranged reads on S3), only the first record batch body is read, for the key sample
+        with open_columnar(file_path, block_size=ARROW_IPC_METADATA_BLOCK_SIZE) as source:
+            reader = pa.ipc.open_file(source)
+            schema = reader.schema
+            columns = schema.names
+            row_count, null_counts = read_arrow_ipc_counts(source, schema)
+            key_sample = reader.get_batch(0).slice(0, lines_to_read).to_pandas() if reader.num_record_batches \
+                else pd.DataFrame(columns=columns)
+
+    # Nested columns can't be hashed, they are left out of key detection
+    hashable_columns = [column for column in columns if not pa.types.is_nested(schema.field(column).type)]
+    key_sample = key_sample[hashable_columns]
+    column_hashes = get_column_hashes(key_sample)
+    distinct_counts = {column: len(np.unique(hashes)) for column, hashes in column_hashes.items()}
+    unique_keys = find_unique_keys(key_sample, column_hashes=column_hashes)
+
+    return FileProfile(file_path=file_path,
+                       file_type=file_type,
+                       delimiter=None,
+                       quote_char=None,
+                       line_terminator=None,
+                       compression="NONE",
+                       columns=columns,
+                       header=[col.replace(" ", "_").upper() for col in columns],
+                       data_types={column: get_arrow_data_types(schema.field(column).type) for column in columns},
+                       null_rates={column: null_count / row_count if row_count else 0.0
+                                   for column, null_count in null_counts.items() if null_count is not None},
+                       distinct_counts=distinct_counts,
+                       unique_keys=[col.replace(" ", "_").upper() for col in unique_keys],
+                       row_count=row_count)
+
+
+def read_file_header(file_path):
+    """
+    Reads only the column names of a file, from the sniffed header line of a delimited file or from the schema
+    in the metadata of a Parquet or Arrow IPC file. Cheap enough to run on every arriving file.
+
+    :param file_path: Path to the file
+    :return: List of column names
+    """
+    file_type = detect_file_type(file_path)
+    if file_type != "CSV":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(f"pyarrow package is required to read the schema of {file_type.lower()} file {file_path}")
+
+        if file_type == "PARQUET":
+            with open_columnar(file_path) as source:
+                return pq.read_schema(source).names
+        with open_columnar(file_path) as source:
+            return pa.ipc.open_file(source).schema.names
+
+    compression = detect_compression(file_path)
+    sniffed_format = sniff_file_format(file_path, compression=compression)
+    with open_input(file_path, compression) as file:
+        reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline=""),
+                            delimiter=sniffed_format["delimiter"], quotechar=sniffed_format["quote_char"])
+        return next(reader, [])
@@ -1,10 +1,24 @@
+import bz2
 import csv
+import gzip
+import mmap
+import os
 import re
-
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Optional
+
+import numpy as np
 import pandas as pd
 import logging
 import json
 
+from core_utils.output_sinks import FileSystemSink
+
 # Mapping from pandas data types to Snowflake data types
 PANDAS_TO_SNOWFLAKE_TYPES = {
     "int64": "NUMBER",
@@ -24,98 +38,845 @@ PANDAS_TO_POSTGRES_TYPES = {
     "category": "TEXT"
 }
 
+# Magic bytes identifying columnar files, their schema lives in the file metadata
+COLUMNAR_MAGIC_BYTES = {
+    b"PAR1": "PARQUET",
+    b"ARROW1": "ARROW"
+}
+
+# Magic bytes at the start of compressed files, mapped to Snowflake COMPRESSION names
+COMPRESSION_MAGIC_BYTES = {
+    b"\x1f\x8b": "GZIP",
+    b"BZh": "BZ2",
+    b"\x28\xb5\x2f\xfd": "ZSTD"
+}
+# File extension written for each compression, and the extensions recognised when stripping it from a file name
+COMPRESSION_EXTENSIONS = {
+    "GZIP": ["gz", "gzip"],
+    "BZ2": ["bz2"],
+    "ZSTD": ["zst", "zstd"]
+}
+
+
+def is_s3_uri(file_path):
+    return isinstance(file_path, str) and file_path.startswith("s3://")
+
+
+def open_raw(file_path):
+    """
+    Opens a local file, or an s3:// object through ranged reads, for binary reading without decompressing it.
+    """
+    if is_s3_uri(file_path):
+        from core_utils.s3_utils import open_s3_object
+
+        return open_s3_object(file_path)
+    return open(file_path, 'rb')
+
+
+def detect_compression(file_path):
+    """
+    Detects the compression of a file from its magic bytes, the file extension is not looked at.
+
+    :param file_path: Path to the file
+    :return: GZIP, BZ2, ZSTD or NONE
+    """
+    with open_raw(file_path) as file:
+        return get_compression(file.read(4))
+
+
+def get_compression(head):
+    """
+    Returns the compression the first bytes of a file start with, GZIP, BZ2, ZSTD or NONE.
+    """
+    for magic_bytes, compression in COMPRESSION_MAGIC_BYTES.items():
+        if head.startswith(magic_bytes):
+            return compression
+    return "NONE"
+
+
+def detect_file_type(file_path):
+    """
+    Detects whether a file is Parquet, Arrow IPC or delimited text from its magic bytes.
+
+    :param file_path: Path to the file
+    :return: PARQUET, ARROW or CSV
+    """
+    with open_raw(file_path) as file:
+        head = file.read(6)
+
+    for magic_bytes, file_type in COLUMNAR_MAGIC_BYTES.items():
+        if head.startswith(magic_bytes):
+            return file_type
+    return "CSV"
+
+
+def get_arrow_data_types(arrow_type):
+    """
+    Maps an Arrow data type, as found in a Parquet or Arrow IPC schema, to Snowflake and Postgres data types.
+    """
+    import pyarrow as pa
+
+    if pa.types.is_boolean(arrow_type):
+        snowflake_dtype, postgres_dtype = "BOOLEAN", "BOOLEAN"
+    elif pa.types.is_integer(arrow_type):
+        snowflake_dtype, postgres_dtype = "NUMBER", "NUMERIC"
+    elif pa.types.is_floating(arrow_type):
+        snowflake_dtype, postgres_dtype = "FLOAT", "DOUBLE PRECISION"
+    elif pa.types.is_decimal(arrow_type):
+        snowflake_dtype = f"NUMBER({arrow_type.precision},{arrow_type.scale})"
+        postgres_dtype = f"NUMERIC({arrow_type.precision},{arrow_type.scale})"
+    elif pa.types.is_date(arrow_type):
+        snowflake_dtype, postgres_dtype = "DATE", "DATE"
+    elif pa.types.is_timestamp(arrow_type):
+        if arrow_type.tz:
+            snowflake_dtype, postgres_dtype = "TIMESTAMP_TZ", "TIMESTAMPTZ"
+        else:
+            snowflake_dtype, postgres_dtype = "TIMESTAMP_NTZ", "TIMESTAMP"
+    elif pa.types.is_time(arrow_type):
+        snowflake_dtype, postgres_dtype = "TIME", "TIME"
+    elif pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type) or pa.types.is_fixed_size_list(arrow_type):
+        snowflake_dtype, postgres_dtype = "ARRAY", "JSONB"
+    elif pa.types.is_struct(arrow_type) or pa.types.is_map(arrow_type):
+        snowflake_dtype, postgres_dtype = "OBJECT", "JSONB"
+    elif pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type) \
+            or pa.types.is_fixed_size_binary(arrow_type):
+        snowflake_dtype, postgres_dtype = "BINARY", "BYTEA"
+    else:
+        snowflake_dtype, postgres_dtype = "TEXT", "TEXT"
+
+    try:
+        pandas_dtype = str(pd.api.types.pandas_dtype(arrow_type.to_pandas_dtype()))
+    except (NotImplementedError, TypeError):
+        pandas_dtype = "object"
+
+    return {
+        "pandas_dtype": pandas_dtype,
+        "snowflake_dtype": snowflake_dtype,
+        "postgres_dtype": postgres_dtype
+    }
+
+
+def open_input(file_path, compression=None):
+    """
+    Opens a file for binary reading, decompressing it on the fly when it is compressed.
+    Nothing is written to disk, the returned handle streams the decompressed bytes.
+
+    :param file_path: Path to the file or s3:// URI
+    :param compression: Compression of the file when already detected, detected from its magic bytes otherwise
+    :return: Binary file handle
+    """
+    compression = compression or detect_compression(file_path)
+    # S3 objects are streamed through ranged reads, local files are opened by path
+    source = file_path if not is_s3_uri(file_path) or compression in ("NONE", "ZSTD") else open_raw(file_path)
+    if compression == "GZIP":
+        return gzip.open(source, 'rb')
+    if compression == "BZ2":
+        return bz2.open(source, 'rb')
+    if compression == "ZSTD":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"zstandard package is required to read zstd compressed file {file_path}")
+        return zstandard.ZstdDecompressor().stream_reader(open_raw(file_path), closefd=True)
+    return open_raw(file_path)
+
+
+def get_file_extension(file_path, compression="NONE"):
+    """
+    Builds the file extension from the file name and the detected compression, e.g. csv.gz for a gzip csv,
+    whether or not the file name itself carries the compression extension.
+    """
+    name_parts = os.path.basename(file_path).split(".")[1:]
+    compression_extensions = [ext for extensions in COMPRESSION_EXTENSIONS.values() for ext in extensions]
+    while name_parts and name_parts[-1].lower() in compression_extensions:
+        name_parts.pop()
+
+    extension = name_parts[-1] if name_parts else ""
+    if compression != "NONE":
+        extension = f"{extension}.{COMPRESSION_EXTENSIONS[compression][0]}" if extension \
+            else COMPRESSION_EXTENSIONS[compression][0]
+    return extension
+
+
+# Environment variable selecting the parse engine when none is passed, pandas or pyarrow
+PARSE_ENGINE_ENV = "CORE_UTILS_PARSE_ENGINE"
+PARSE_ENGINES = ["pandas", "pyarrow"]
+# Strings pandas reads as null, used by the pyarrow engine so both engines see the same nulls
+PANDAS_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+ARROW_BLOCK_SIZE = 1 << 24
+# Values pandas parses as int64 and float64, checked up front because a failing Arrow cast is expensive
+INT_VALUE_REGEX = r"^\s*[+-]?\d+\s*$"
+FLOAT_VALUE_REGEX = r"^\s*[+-]?(\d+\.?\d*([eE][+-]?\d+)?|\.\d+([eE][+-]?\d+)?|inf|infinity)\s*$"
+
+
+def get_parse_engine(engine=None):
+    """
+    Resolves the parse engine from the argument, then the CORE_UTILS_PARSE_ENGINE environment variable,
+    defaulting to pandas. Falls back to pandas when pyarrow is not installed.
+    """
+    engine = (engine or os.getenv(PARSE_ENGINE_ENV) or "pandas").lower()
+    if engine not in PARSE_ENGINES:
+        raise ValueError(f"Unknown parse engine '{engine}', expected one of {PARSE_ENGINES}")
+
+    if engine == "pyarrow":
+        try:
+            import pyarrow.csv
+        except ImportError:
+            logging.warning("pyarrow is not installed, falling back to pandas parse engine")
+            return "pandas"
+    return engine
+
+
+def read_csv_chunks(file_path, delimiter=",", quote_char='"', chunk_size=100000, nrows=None, header=0, engine=None,
+                    line_terminator=None, compression=None):
+    """
+    Parses a delimited file into DataFrames of at most chunk_size rows, decompressing it on the fly.
+
+    The pandas engine is single threaded. The pyarrow engine tokenizes and converts blocks of the file on all
+    cores and casts the columns the way pandas would infer them, so both engines give the same dtypes.
+
+    :param file_path: Path to the file
+    :param delimiter: Field delimiter
+    :param quote_char: Quote char
+    :param chunk_size: Maximum number of rows in a yielded frame
+    :param nrows: Stop after this many data rows, the whole file when None
+    :param header: Row number of the header line
+    :param engine: pandas or pyarrow, see get_parse_engine
+    :param line_terminator: Sniffed line terminator, pyarrow recognises every terminator by itself
+    :param compression: Compression of the file when already detected
+    :return: Generator of DataFrames
+    """
+    if get_parse_engine(engine) == "pyarrow":
+        yield from read_csv_chunks_arrow(file_path, delimiter, quote_char, chunk_size, nrows, header, compression)
+        return
+
+    read_params = {"sep": delimiter, "quotechar": quote_char, "on_bad_lines": "skip", "header": header}
+    # pandas splits on \n and \r\n by default and only takes single character terminators, e.g. \r
+    if line_terminator and len(line_terminator) == 1 and line_terminator != "\n":
+        read_params["lineterminator"] = line_terminator
+    with open_input(file_path, compression) as handle:
+        if nrows is not None and nrows <= chunk_size:
+            yield pd.read_csv(handle, nrows=nrows, **read_params)
+            return
+
+        with pd.read_csv(handle, chunksize=chunk_size, nrows=nrows, **read_params) as reader:
+            yield from reader
+
+
+def read_csv_chunks_arrow(file_path, delimiter, quote_char, chunk_size, nrows, header, compression=None):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    # Sampling only needs the head of the file, smaller blocks avoid parsing far past nrows
+    block_size = ARROW_BLOCK_SIZE if nrows is None else 1 << 20
+    read_options = pacsv.ReadOptions(use_threads=True, skip_rows=header, block_size=block_size)
+    parse_options = pacsv.ParseOptions(delimiter=delimiter, quote_char=quote_char, newlines_in_values=True,
+                                       invalid_row_handler=lambda row: "skip")
+
+    # Columns are read as strings so a late non numeric value can't fail the read, types are inferred per block
+    header_options = pacsv.ReadOptions(skip_rows=header, block_size=1 << 20)
+    with open_input(file_path, compression) as handle:
+        column_names = pacsv.open_csv(handle, read_options=header_options, parse_options=parse_options).schema.names
+    convert_options = pacsv.ConvertOptions(column_types={name: pa.string() for name in column_names},
+                                           null_values=PANDAS_NA_VALUES, strings_can_be_null=True)
+
+    rows_read = 0
+    with open_input(file_path, compression) as handle:
+        reader = pacsv.open_csv(handle, read_options=read_options, parse_options=parse_options,
+                                convert_options=convert_options)
+        for batch in reader:
+            if nrows is not None:
+                batch = batch.slice(0, nrows - rows_read)
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield cast_string_batch(batch.slice(offset, chunk_size))
+            rows_read += batch.num_rows
+            if nrows is not None and rows_read >= nrows:
+                break
+
+        if rows_read == 0:
+            yield pd.DataFrame(columns=column_names)
+
+
+def cast_string_batch(batch):
+    """
+    Casts the string columns of an Arrow record batch to the dtype pandas would infer for them
+    (int64, float64, bool or object) and returns the batch as a DataFrame.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = {}
+    for name, array in zip(batch.schema.names, batch.columns):
+        values = array.drop_null()
+        cast_array = array
+        if len(values) > 0:
+            if pc.all(pc.is_in(pc.utf8_lower(values), value_set=pa.array(["true", "false"]))).as_py():
+                cast_array = pc.cast(array, pa.bool_())
+            elif pc.all(pc.match_substring_regex(values, INT_VALUE_REGEX)).as_py():
+                try:
+                    cast_array = pc.cast(pc.utf8_trim_whitespace(array), pa.int64())
+                except pa.ArrowInvalid:
+                    # Integers wider than int64 stay strings, pandas reads them as object too
+                    pass
+            elif pc.all(pc.match_substring_regex(values, FLOAT_VALUE_REGEX, ignore_case=True)).as_py():
+                try:
+                    cast_array = pc.cast(pc.utf8_trim_whitespace(array), pa.float64())
+                except pa.ArrowInvalid:
+                    pass
+        columns[name] = cast_array
+
+    # Nullable bools come back as object and nullable ints as float64, the same dtypes pandas gives them
+    return pa.table(columns).to_pandas()
+
+
+# Common delimiters to check
+SNIFF_DELIMITERS = [',', ';', '\t', '|']
+SNIFF_QUOTE_CHARS = ['"', "'"]
+
+
+def sniff_sample(sample, truncated=False, max_lines=200):
+    """
+    Detects delimiter, quote char and line terminator of a raw byte sample of a delimited file.
+
+    Quoted fields are removed before counting, so delimiters and line breaks inside quotes are ignored.
+    The delimiter is the one which gives the most consistent field count across the sampled lines.
+
+    :param sample: Bytes read from the start of the file
+    :param truncated: Whether the sample ends mid file, in which case the last partial line is dropped
+    :param max_lines: Maximum number of lines compared
+    :return: dict with delimiter, quote_char and line_terminator
+    """
+    if b"\r\n" in sample:
+        line_terminator = "\r\n"
+    elif b"\n" not in sample and b"\r" in sample:
+        line_terminator = "\r"
+    else:
+        line_terminator = "\n"
+
+    # Only max_lines lines are compared, the rest of the window isn't scanned
+    terminator_bytes, position = line_terminator.encode(), 0
+    for _ in range(max_lines + 1):
+        position = sample.find(terminator_bytes, position)
+        if position == -1:
+            break
+        position += len(terminator_bytes)
+    else:
+        sample, truncated = sample[:position], True
+
+    # Quote char is the one opening a field, i.e. right after a delimiter or at the start of a line
+    field_starts = [char.encode() for char in SNIFF_DELIMITERS] + [b"\n", b"\r"]
+    quote_counts = {quote_char: sum(sample.count(start + quote_char.encode()) for start in field_starts)
+                    + sample.startswith(quote_char.encode()) if quote_char.encode() in sample else 0
+                    for quote_char in SNIFF_QUOTE_CHARS}
+    quote_char = max(SNIFF_QUOTE_CHARS, key=lambda char: quote_counts[char])
+    if quote_counts[quote_char] == 0:
+        quote_char = '"'
+
+    # Escaped quotes ("") match as an empty quoted string, so they go away together with the quoted fields
+    unquoted = re.sub(f"{quote_char}[^{quote_char}]*{quote_char}".encode(), b"", sample)
+
+    lines = unquoted.split(line_terminator.encode())
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]
+    lines = [line for line in lines if line.strip()][:max_lines]
+
+    best_delimiter, best_score = ',', (0, 0)
+    for delimiter in SNIFF_DELIMITERS:
+        delimiter_bytes = delimiter.encode()
+        counts = Counter(line.count(delimiter_bytes) for line in lines)
+        if not counts:
+            continue
+        modal_count, modal_lines = max(counts.items(), key=lambda item: (item[1], item[0]))
+        if modal_count == 0:
+            continue
+        score = (modal_lines / len(lines), modal_count)
+        if score > best_score:
+            best_delimiter, best_score = delimiter, score
+
+    return {
+        "delimiter": best_delimiter,
+        "quote_char": quote_char,
+        "line_terminator": line_terminator
+    }
+
+
+def sniff_file_format(file_path, sample_bytes=65536, compression=None):
+    """
+    Reads a byte window from the start of the file once and detects its delimited format.
+    Local files are memory-mapped and plain or GZIP/BZ2 windows are sniffed without a second open,
+    S3 and ZSTD files are decompressed while streaming.
+
+    :param file_path: Path to the file
+    :param sample_bytes: Size of the window read from the file
+    :param compression: Compression of the file when already detected
+    :return: dict with delimiter, quote_char and line_terminator
+    """
+    sample = None
+    if not file_path.startswith("s3://"):
+        sample = read_local_window(file_path, sample_bytes, compression)
+
+    if sample is None:
+        with open_input(file_path, compression) as file:
+            # Decompressing readers may return short reads, keep reading until the window is full
+            sample = b""
+            while len(sample) < sample_bytes:
+                data = file.read(sample_bytes - len(sample))
+                if not data:
+                    break
+                sample += data
+
+    return sniff_sample(sample, truncated=len(sample) == sample_bytes)
+
+
+def read_local_window(file_path, sample_bytes, compression=None):
+    """
+    Memory-maps the start of a local file and returns up to sample_bytes of its decompressed content.
+    Returns None when the window can't be decoded in one go (ZSTD or a compressed window decoding short),
+    the caller then streams the file instead.
+    """
+    with open(file_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return b""
+        window_size = min(size, sample_bytes)
+        with mmap.mmap(file.fileno(), window_size, access=mmap.ACCESS_READ) as window:
+            compression = compression or get_compression(window[:4])
+            if compression == "NONE":
+                return window[:]
+            if compression == "GZIP":
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                sample = decompressor.decompress(window, sample_bytes)
+            elif compression == "BZ2":
+                decompressor = bz2.BZ2Decompressor()
+                sample = decompressor.decompress(window, max_length=sample_bytes)
+            else:
+                return None
+
+    # A short sample is only complete when the whole file was read and holds a single stream
+    if len(sample) < sample_bytes and (window_size < size or decompressor.unused_data):
+        return None
+    return sample
+
+
 def identify_delimiter(file_path):
-    # Open the file and read the first 3 lines
-    with open(file_path, 'r', errors='ignore') as file:
-        lines = [file.readline() for _ in range(3)]
+    return sniff_file_format(file_path)["delimiter"]
 
-    # Join the first 3 lines to form a sample text
-    sample = ''.join(lines)
 
-    # Common delimiters to check
-    delimiters = [',', ';', '\t', '|']
-    delimiter_counts = {delimiter: sample.count(delimiter) for delimiter in delimiters}
+# Candidate formats for text columns holding dates or timestamps, a column keeps the formats every value matches.
+# Only ISO formats, the ones the generated file format (DATE_FORMAT='YYYY-MM-DD', TIMESTAMP_FORMAT=AUTO) and the
+# Postgres loads parse unambiguously, other formats stay text
+DATE_FORMATS = ["%Y-%m-%d"]
+TIMESTAMP_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S.%f",
+                     "%Y-%m-%d %H:%M"]
+# Largest precision of Snowflake NUMBER and the one we allow for Postgres NUMERIC
+MAX_DECIMAL_PRECISION = 38
 
-    # Find the delimiter with the highest count
-    identified_delimiter = max(delimiter_counts, key=delimiter_counts.get)
 
-    return identified_delimiter
+@dataclass
+class ColumnTypeStats:
+    """
+    Running type statistics for a single column. Each chunk of the file updates the stats and the
+    column dtype only ever widens (bool/int64 -> float64 -> object), so the final dtype holds for every row seen.
 
+    Alongside the dtype it keeps the widest text value, the integer digits and scale of numeric values and
+    the date/timestamp formats matched by every text value, which give the precise database types.
+    """
+    pandas_dtype: Optional[str] = None
+    row_count: int = 0
+    null_count: int = 0
+    max_length: int = 0
+    integer_digits: int = 0
+    scale: int = 0
+    fixed_point: bool = True
+    datetime_formats: Optional[List[str]] = None
+
+    def update(self, series):
+        nulls = int(series.isna().sum())
+        self.row_count += len(series)
+        self.null_count += nulls
+
+        # Columns that are entirely null in this chunk carry no type information
+        if nulls < len(series):
+            chunk_dtype = normalize_dtype(series.dtype)
+            self.pandas_dtype = widen_dtype(self.pandas_dtype, chunk_dtype)
+            self.update_value_stats(series.dropna(), chunk_dtype)
+        return self
+
+    def update_value_stats(self, values, chunk_dtype):
+        if chunk_dtype == "object":
+            strings = values.astype(str)
+            self.max_length = max(self.max_length, int(strings.str.len().max()))
+
+            candidate_formats = DATE_FORMATS + TIMESTAMP_FORMATS if self.datetime_formats is None \
+                else self.datetime_formats
+            self.datetime_formats = [datetime_format for datetime_format in candidate_formats
+                                     if matches_datetime_format(strings, datetime_format)]
+        elif chunk_dtype in ("int64", "float64"):
+            # Numbers written as text later on are as wide as their digits, sign and decimal point
+            self.update_numeric_stats(values, chunk_dtype)
+            self.max_length = max(self.max_length, self.integer_digits + self.scale + 2)
+            self.datetime_formats = []
+        else:
+            self.max_length = max(self.max_length, 5)
+            self.datetime_formats = []
+
+    def update_numeric_stats(self, values, chunk_dtype):
+        if chunk_dtype == "int64":
+            self.integer_digits = max(self.integer_digits, len(str(int(values.abs().max()))))
+            return
+
+        strings = values.abs().astype(str)
+        if strings.str.contains("e|inf", regex=True).any():
+            self.fixed_point = False
+            return
+        parts = strings.str.split(".", n=1, expand=True)
+        self.integer_digits = max(self.integer_digits, int(parts[0].str.len().max()))
+        if parts.shape[1] > 1:
+            self.scale = max(self.scale, int(parts[1].str.rstrip("0").str.len().max()))
+
+    def merge(self, other):
+        """
+        Merges the statistics of the same column from another file, as if both files had been read as one.
+        """
+        self.row_count += other.row_count
+        self.null_count += other.null_count
+        # A column without values in either file carries no type information from it
+        if other.pandas_dtype is None:
+            return self
+        if self.pandas_dtype is None:
+            self.pandas_dtype = other.pandas_dtype
+            self.max_length, self.integer_digits, self.scale = other.max_length, other.integer_digits, other.scale
+            self.fixed_point, self.datetime_formats = other.fixed_point, other.datetime_formats
+            return self
+
+        self.pandas_dtype = widen_dtype(self.pandas_dtype, other.pandas_dtype)
+        self.max_length = max(self.max_length, other.max_length)
+        self.integer_digits = max(self.integer_digits, other.integer_digits)
+        self.scale = max(self.scale, other.scale)
+        self.fixed_point = self.fixed_point and other.fixed_point
+        self.datetime_formats = [datetime_format for datetime_format in self.datetime_formats or []
+                                 if datetime_format in (other.datetime_formats or [])]
+        return self
+
+    def get_pandas_dtype(self):
+        # A column that never had a value is kept as text
+        return self.pandas_dtype or "object"
+
+    def get_datetime_format(self):
+        if self.get_pandas_dtype() == "object" and self.datetime_formats:
+            return self.datetime_formats[0]
+        return None
+
+    def get_db_types(self, sized=True):
+        """
+        Returns the precise Snowflake and Postgres types: DATE, TIMESTAMP_NTZ, NUMBER(p,s) and VARCHAR(n)
+        where the statistics allow it, otherwise the types of PANDAS_TO_SNOWFLAKE_TYPES/PANDAS_TO_POSTGRES_TYPES.
+
+        :param sized: Size VARCHAR and NUMBER to the values seen. Only safe when every value was seen, otherwise
+                      text is unbounded VARCHAR and decimals NUMBER(38,s) (Postgres NUMERIC) so longer or wider
+                      values arriving later still load
+        """
+        pandas_dtype = self.get_pandas_dtype()
+        if self.pandas_dtype is None:
+            return "TEXT", "TEXT"
+
+        if pandas_dtype == "object":
+            datetime_format = self.get_datetime_format()
+            if datetime_format in DATE_FORMATS:
+                return "DATE", "DATE"
+            if datetime_format in TIMESTAMP_FORMATS:
+                return "TIMESTAMP_NTZ", "TIMESTAMP"
+            if not sized:
+                return "VARCHAR", "VARCHAR"
+            return f"VARCHAR({max(self.max_length, 1)})", f"VARCHAR({max(self.max_length, 1)})"
+
+        if pandas_dtype == "float64" and self.fixed_point:
+            if not sized:
+                return f"NUMBER({MAX_DECIMAL_PRECISION},{self.scale})", "NUMERIC"
+            precision = max(self.integer_digits + self.scale, 1)
+            if precision <= MAX_DECIMAL_PRECISION:
+                return f"NUMBER({precision},{self.scale})", f"NUMERIC({precision},{self.scale})"
+
+        return PANDAS_TO_SNOWFLAKE_TYPES.get(pandas_dtype, "TEXT"), PANDAS_TO_POSTGRES_TYPES.get(pandas_dtype, "TEXT")
+
+
+def matches_datetime_format(strings, datetime_format, head_size=100):
+    # A small head rules out most columns before the whole chunk is parsed
+    for values in (strings.head(head_size), strings):
+        if not pd.to_datetime(values, format=datetime_format, errors="coerce").notna().all():
+            return False
+        if len(values) == len(strings):
+            break
+    return True
 
-def infer_and_convert_data_types(csv_file_path, lines_to_read=5000):
-    # Read only the first `lines_to_read` rows of the CSV file
-    df = pd.read_csv(csv_file_path, on_bad_lines='skip', nrows=lines_to_read)
 
-    # Identify the header
-    header = [col.replace(" ", "_").upper() for col in list(df.columns)]
+def normalize_dtype(dtype):
+    """
+    Collapses a pandas dtype into one of the dtypes known to PANDAS_TO_SNOWFLAKE_TYPES.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "int64"
+    if pd.api.types.is_float_dtype(dtype):
+        return "float64"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime64[ns]"
+    return "object"
+
+
+def widen_dtype(current_dtype, new_dtype):
+    """
+    Returns the narrowest dtype which can hold values of both dtypes.
+    """
+    if current_dtype is None or current_dtype == new_dtype:
+        return new_dtype
+    if {current_dtype, new_dtype} == {"int64", "float64"}:
+        return "float64"
+    return "object"
 
-    # Infer data types and map to Snowflake data types
+
+def get_column_data_types(column_stats, precise_types=False, sized_types=True):
+    """
+    Maps per column type statistics to pandas, Snowflake and Postgres data types.
+
+    :param column_stats: ColumnTypeStats per column
+    :param precise_types: Emit DATE, TIMESTAMP_NTZ, NUMBER(p,s) and VARCHAR(n) from the column statistics
+                          instead of mapping the pandas dtype only
+    :param sized_types: Size VARCHAR and NUMBER to the values seen, only when the statistics cover every value,
+                        see ColumnTypeStats.get_db_types
+    """
     column_data_types = {}
-    for column in df.columns:
-        pandas_dtype = str(df[column].dtype)
-        snowflake_dtype = PANDAS_TO_SNOWFLAKE_TYPES.get(pandas_dtype, "TEXT")  # Default to TEXT if no match
-        postgres_dtype = PANDAS_TO_POSTGRES_TYPES.get(pandas_dtype, "TEXT")  # Default to TEXT if no match
+    for column, stats in column_stats.items():
+        pandas_dtype = stats.get_pandas_dtype()
+        if precise_types:
+            snowflake_dtype, postgres_dtype = stats.get_db_types(sized=sized_types)
+        else:
+            snowflake_dtype = PANDAS_TO_SNOWFLAKE_TYPES.get(pandas_dtype, "TEXT")  # Default to TEXT if no match
+            postgres_dtype = PANDAS_TO_POSTGRES_TYPES.get(pandas_dtype, "TEXT")  # Default to TEXT if no match
         column_data_types[column] = {
             "pandas_dtype": pandas_dtype,
             "snowflake_dtype": snowflake_dtype,
             "postgres_dtype": postgres_dtype
         }
+    return column_data_types
+
+
+def infer_and_convert_data_types(csv_file_path, lines_to_read=5000, full_scan=False, chunk_size=100000,
+                                 delimiter=",", quote_char='"', engine=None, precise_types=False, line_terminator=None):
+    """
+    Infers column data types of a CSV file.
+
+    :param csv_file_path: Path to the CSV file
+    :param delimiter: Field delimiter of the file
+    :param quote_char: Quote char of the file
+    :param lines_to_read: Number of rows sampled from the top of the file when full_scan is off
+    :param full_scan: Walk the whole file in chunks of chunk_size rows, widening types as it goes.
+                      Memory stays bounded by the chunk size regardless of the file size.
+    :param chunk_size: Number of rows parsed at a time in full scan mode
+    :param engine: Parse engine, pandas or pyarrow, see get_parse_engine
+    :param precise_types: Detect dates, timestamps, decimals and string widths, see get_column_data_types
+    :param line_terminator: Sniffed line terminator of the file
+    :return: header and column data types
+    """
+    column_stats = {}
+    for chunk in read_csv_chunks(csv_file_path, delimiter=delimiter, quote_char=quote_char, chunk_size=chunk_size,
+                                 nrows=None if full_scan else lines_to_read, engine=engine,
+                                 line_terminator=line_terminator):
+        for column in chunk.columns:
+            column_stats.setdefault(column, ColumnTypeStats()).update(chunk[column])
+
+    # Identify the header
+    header = [col.replace(" ", "_").upper() for col in column_stats]
+
+    # Infer data types and map to Snowflake data types
+    # Sizes of the first rows would fail on the first longer value further down the file
+    column_data_types = get_column_data_types(column_stats, precise_types=precise_types, sized_types=full_scan)
 
     return header, column_data_types
 
 
-def read_and_infer(file_path):
+def read_and_infer(file_path, full_scan=False, engine=None):
     # Identify the delimiter
-    delimiter = identify_delimiter(file_path)
+    sniffed_format = sniff_file_format(file_path)
+    delimiter = sniffed_format["delimiter"]
     logging.info(f"Identified delimiter: {delimiter}")
 
-    header, data_types = infer_and_convert_data_types(file_path, lines_to_read=5000)
+    header, data_types = infer_and_convert_data_types(file_path, lines_to_read=5000, full_scan=full_scan,
+                                                      delimiter=delimiter, quote_char=sniffed_format["quote_char"],
+                                                      engine=engine, line_terminator=sniffed_format["line_terminator"])
 
     return delimiter, header, data_types
 
-def get_unique_keys(file_path,delimiter,header_line,num_rows=5000):
+def get_column_hashes(df):
+    """
+    Hashes every column of the frame to uint64 once, so distinct counts and key checks work on fixed width arrays.
+    """
+    return {column: pd.util.hash_pandas_object(df[column], index=False).to_numpy() for column in df.columns}
 
-    df = pd.read_csv(file_path, engine="python", on_bad_lines="skip", sep=delimiter, header=header_line-1, nrows=num_rows)
 
-    unique_columns = []
-    for (col, dtype) in df.dtypes.items():
-        unique_columns.append(col)
-        max_value = df.value_counts(unique_columns,dropna=False).max()
-        if max_value==1:
-            break
+def combine_hashes(column_hashes, columns):
+    # Order sensitive mix of the column hashes, overflow wraps around which is what we want here
+    combined = np.zeros(len(column_hashes[columns[0]]), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in columns:
+            combined = combined * np.uint64(1000003) ^ column_hashes[column]
+    return combined
+
+
+def find_unique_keys(df, max_key_size=3, max_candidates=20, column_hashes=None):
+    """
+    Finds the smallest combination of columns which uniquely identifies every row of the frame.
+
+    Columns are ranked by distinct count, then combinations of up to max_key_size columns are checked
+    among the max_candidates highest cardinality columns. A combination is skipped when the product of its
+    distinct counts is lower than the row count, as it can't be unique.
+
+    :param df: Sampled rows of the file
+    :param max_key_size: Largest number of columns tried in a key
+    :param max_candidates: Number of highest cardinality columns considered for multi column keys
+    :param column_hashes: Column hashes from get_column_hashes, computed from df when not given
+    :return: Key columns in file order, all columns when no smaller key exists
+    """
+    row_count = len(df)
+    columns = list(df.columns)
+    if row_count == 0 or not columns:
+        return columns
+
+    if column_hashes is None:
+        column_hashes = get_column_hashes(df)
+    distinct_counts = {column: len(np.unique(hashes)) for column, hashes in column_hashes.items()}
+
+    # Highest cardinality first, file order breaks ties
+    ranked_columns = sorted(columns, key=lambda column: (-distinct_counts[column], columns.index(column)))
+
+    if distinct_counts[ranked_columns[0]] == row_count:
+        return [ranked_columns[0]]
+
+    candidates = ranked_columns[:max_candidates]
+    for key_size in range(2, max_key_size + 1):
+        for key_columns in combinations(candidates, key_size):
+            if np.prod([distinct_counts[column] for column in key_columns], dtype=float) < row_count:
+                continue
+            if len(np.unique(combine_hashes(column_hashes, key_columns))) == row_count:
+                return sorted(key_columns, key=columns.index)
+
+    logging.info(f"No unique key found with up to {max_key_size} columns, using all columns")
+    return columns
+
+
+def get_unique_keys(file_path, delimiter, header_line, num_rows=5000, engine=None):
+
+    df = pd.concat(read_csv_chunks(file_path, delimiter=delimiter, header=header_line-1, nrows=num_rows,
+                                   chunk_size=num_rows, engine=engine))
+
+    unique_columns = find_unique_keys(df)
 
     unique_keys = [col.replace(" ", "_").upper() for col in unique_columns]
 
     return unique_keys
 
-def write_to_json_file(data, file_path):
+# Lists the files written by the previous generation run, so outputs which are no longer generated get removed
+GENERATED_FILES_MANIFEST = ".generated_files.json"
+
+
+@dataclass
+class GenerationReport:
     """
-    Writes the given data to a JSON file.
+    Changed, unchanged and removed output files of a generation run.
+    """
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def record(self, file_path, status):
+        if status == "changed":
+            self.changed.append(file_path)
+        elif status == "unchanged":
+            self.unchanged.append(file_path)
+
+    def remove_stale_outputs(self, manifest_path, sink=None):
+        """
+        Removes the files listed in manifest_path by the previous run which were not generated by this run,
+        then records this run's files in the manifest.
+
+        :param manifest_path: JSON file listing the files generated by the previous run
+        :param sink: OutputSink holding the outputs, defaults to the file system
+        """
+        sink = sink or FileSystemSink()
+        # Paths are kept relative to the manifest, so the output dir can be moved or synced elsewhere
+        manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+        generated = {os.path.relpath(os.path.abspath(file_path), manifest_dir)
+                     for file_path in self.changed + self.unchanged}
+        if sink.exists(manifest_path):
+            previous = json.loads(sink.read(manifest_path))
+            for relative_path in previous:
+                file_path = os.path.join(manifest_dir, relative_path)
+                if relative_path not in generated and sink.exists(file_path):
+                    sink.remove(file_path)
+                    self.removed.append(file_path)
+                    logging.info(f"Removed stale output {file_path}")
+
+        sink.write(manifest_path, json.dumps(sorted(generated), indent=4))
+
+    def summary(self):
+        return {"changed": len(self.changed), "unchanged": len(self.unchanged), "removed": len(self.removed)}
+
+
+def write_to_json_file(data, file_path, report=None, sink=None):
+    """
+    Writes the given data to a JSON file, skipped when the file content is unchanged.
 
     :param data: The data to write (should be JSON serializable).
     :param file_path: The path to the JSON file.
+    :param report: GenerationReport recording whether the file changed
+    :param sink: OutputSink the file is written to, defaults to the file system
     """
     try:
-        with open(file_path, 'w') as json_file:
-            json.dump(data, json_file, indent=4)
-        logging.info(f"Data successfully written to {file_path}")
+        status = (sink or FileSystemSink()).write(file_path, json.dumps(data, indent=4))
+        if report is not None:
+            report.record(file_path, status)
+        logging.info(f"Data successfully written to {file_path} ({status})")
     except Exception as e:
         logging.info(f"An error occurred: {e}")
 
-def write_to_file(data, file_path):
+def write_to_file(data, file_path, report=None, sink=None):
     """
-    Writes the given data to a  file.
+    Writes the given data to a  file, skipped when the file content is unchanged.
 
     """
     try:
-        with open(file_path, 'w') as file:
-            file.write(data)
-        logging.info(f"Data successfully written to {file_path}")
+        status = (sink or FileSystemSink()).write(file_path, data)
+        if report is not None:
+            report.record(file_path, status)
+        logging.info(f"Data successfully written to {file_path} ({status})")
     except Exception as e:
         logging.info(f"An error occurred: {e}")
 
 
-import re
+# Date patterns detected in file names when no date format is given, one strptime format per regex group
+DEFAULT_FILE_DATE_REGEX = re.compile(r"(\d{4}-\d{2}-\d{2})|(\d{2}-\d{2}-\d{4})|(\d{4}\d{2}\d{2})|(\d{2}\d{2}\d{4})")
+DEFAULT_FILE_DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%Y%m%d", "%d%m%Y"]
+
+
+@lru_cache(maxsize=128)
+def get_file_date_regex(file_date_format):
+    """
+    Compiles the regex for a file date format like YYYY-MM-DD once, and returns it with its strptime format.
+    """
+    format_map = {
+        "YYYY": r"\d{4}",
+        "MM": r"\d{2}",
+        "DD": r"\d{2}"
+    }
+
+    regex_pattern = file_date_format
+    for key, value in format_map.items():
+        regex_pattern = regex_pattern.replace(key, value)
+
+    date_format = file_date_format.replace("YYYY", "%Y").replace("MM", "%m").replace("DD", "%d")
+    return re.compile(regex_pattern), date_format
 
 
 def get_file_name_pattern(file_name, file_date_format=None):
@@ -129,45 +890,90 @@ def get_file_name_pattern(file_name, file_date_format=None):
     Returns:
         tuple: A string representing the filename pattern with placeholders, and the detected date format.
     """
+    pattern, date_format, _ = match_file_name_date(file_name, file_date_format)
+    return pattern, date_format
+
+
+def match_file_name_date(file_name, file_date_format=None):
+    """
+    Same as get_file_name_pattern, additionally returning the date string found in the file name.
 
+    Returns:
+        tuple: Filename pattern, detected date format and the matched date string (None when there is no date).
+    """
     pattern = file_name
     date_format = ""
+    date_str = None
 
     # If a custom file_date_format is provided, convert to regex pattern
     if file_date_format:
-        format_map = {
-            "YYYY": r"\d{4}",
-            "MM": r"\d{2}",
-            "DD": r"\d{2}"
-        }
+        regex, custom_date_format = get_file_date_regex(file_date_format)
 
-        regex_pattern = file_date_format
-        for key, value in format_map.items():
-            regex_pattern = regex_pattern.replace(key, value)
-
-        datetime_match = re.search(regex_pattern, file_name)
+        datetime_match = regex.search(file_name)
         if datetime_match:
-            date_format = file_date_format.replace("YYYY", "%Y").replace("MM", "%m").replace("DD", "%d")
-            pattern = re.sub(regex_pattern, "{datetime_pattern}", pattern)
+            date_format = custom_date_format
+            date_str = datetime_match.group(0)
+            pattern = regex.sub("{datetime_pattern}", pattern)
 
     else:
         # Default behavior: Detect common date patterns in filenames
-        datetime_match = re.search(r"(\d{4}-\d{2}-\d{2})|(\d{2}-\d{2}-\d{4})|(\d{4}\d{2}\d{2})|(\d{2}\d{2}\d{4})",
-                                   file_name)
+        datetime_match = DEFAULT_FILE_DATE_REGEX.search(file_name)
         if datetime_match:
             date_str = datetime_match.group(0)
+            date_format = DEFAULT_FILE_DATE_FORMATS[datetime_match.lastindex - 1]
+            pattern = pattern.replace(date_str, "{datetime_pattern}")
 
-            if re.match(r"\d{4}-\d{2}-\d{2}", date_str):
-                date_format = "%Y-%m-%d"
-            elif re.match(r"\d{2}-\d{2}-\d{4}", date_str):
-                date_format = "%d-%m-%Y"
-            elif re.match(r"\d{4}\d{2}\d{2}", date_str):
-                date_format = "%Y%m%d"
-            elif re.match(r"\d{2}\d{2}\d{4}", date_str):
-                date_format = "%d%m%Y"
+    return pattern, date_format, date_str
 
-            if date_format:
-                pattern = re.sub(re.escape(date_str), "{datetime_pattern}", pattern)
 
-    return pattern, date_format
+def classify_file_names(file_names, file_date_format=None, holidays=None):
+    """
+    Groups a full listing of file names or object keys by file name pattern in one pass and builds
+    a sorted date index per pattern, flagging the business dates missing between the first and last file.
+
+    :param file_names: File names or object keys, patterns are taken from the base name
+    :param file_date_format: Expected date format (e.g. YYYY-MM-DD), common formats are detected when not given
+    :param holidays: Dates which are not business dates
+    :return: dict of pattern -> {"datetime_pattern", "files": {date: [keys]}, "dates", "missing_dates",
+             "undated_files"}
+    """
+    patterns = {}
+    for file_name in file_names:
+        pattern, date_format, date_str = match_file_name_date(os.path.basename(file_name), file_date_format)
+
+        file_date = None
+        if date_str:
+            try:
+                file_date = datetime.strptime(date_str, date_format).date()
+            except ValueError:
+                file_date = None
+
+        if file_date is None:
+            # Names without a valid date are their own pattern
+            pattern, date_format = os.path.basename(file_name), ""
+
+        classified = patterns.setdefault(pattern, {"datetime_pattern": date_format, "files": {},
+                                                   "undated_files": []})
+        if file_date is None:
+            classified["undated_files"].append(file_name)
+        else:
+            classified["files"].setdefault(file_date, []).append(file_name)
+
+    for classified in patterns.values():
+        classified["dates"] = sorted(classified["files"])
+        classified["missing_dates"] = get_missing_business_dates(classified["dates"], holidays)
+
+    return patterns
+
+
+def get_missing_business_dates(dates, holidays=None):
+    """
+    Returns the business dates between the first and last of the sorted dates which are not in dates.
+    """
+    if not dates:
+        return []
 
+    business_days = np.arange(np.datetime64(dates[0]), np.datetime64(dates[-1]) + 1, dtype="datetime64[D]")
+    business_days = business_days[np.is_busday(business_days, holidays=[np.datetime64(day) for day in holidays or []])]
+    missing = np.setdiff1d(business_days, np.array(dates, dtype="datetime64[D]"))
+    return [day.item() for day in missing]
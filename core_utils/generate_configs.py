@@ -1,12 +1,17 @@
+import json
 import os
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from core_utils.file_utils import read_and_infer, write_to_json_file, write_to_file, get_unique_keys, \
-    get_file_name_pattern
+from core_utils.config_loader import get_current_version
+from core_utils.dataset_schema import infer_dataset_schema, get_base_type
+from core_utils.file_profile import build_file_profile, read_file_header
+from core_utils.file_utils import write_to_json_file, write_to_file, get_file_name_pattern, get_file_extension, \
+    GenerationReport, GENERATED_FILES_MANIFEST
 from core_utils.generate_snowflake_pipeline import SnowflakePipeline
-from core_utils.meta_classes import DatasetConfigs, DatasetVersion, DatasetMirror, DatasetStage
-from pathlib import Path
+from core_utils.profile_cache import ProfileCache, PROFILE_CACHE_FILE_NAME, PROFILE_CACHE_MAX_BYTES
+from core_utils.meta_classes import DatasetConfigs, DatasetVersion, DatasetMirror, DatasetStage, VERSION_OPEN_END_DATE
+from core_utils.output_sinks import FileSystemSink
 
 # Configure logging with datetime
 logging.basicConfig(
@@ -16,6 +21,18 @@ logging.basicConfig(
 )
 
 
+def stage_type_holds(stage_type, file_type):
+    """
+    Whether a column of the current stage type can load the values the file's type was inferred from.
+    Widths are not compared, they depend on the rows sampled. Text holds any value and floats hold integers.
+    """
+    if stage_type is None:
+        return False
+    stage_base, file_base = get_base_type(stage_type), get_base_type(file_type)
+    return stage_base == file_base or stage_base in ("TEXT", "VARCHAR") \
+        or (stage_base, file_base) in (("FLOAT", "NUMBER"), ("DOUBLE PRECISION", "NUMERIC"))
+
+
 class ConfigTemplate():
     def __init__(self, bucket, **kwargs):
         self.file_path = kwargs.get("file_path")
@@ -33,6 +50,22 @@ class ConfigTemplate():
         self.kms_key_id = kwargs.get("kms_key_id", "")
         self.snowflake_stage_name = kwargs.get("snowflake_stage_name")
         self.encoding = kwargs.get("encoding")
+        # Scan the whole file while inferring data types instead of only the first rows
+        self.full_scan_inference = kwargs.get("full_scan_inference", False)
+        # Parse engine used for profiling, pandas or pyarrow, defaults to CORE_UTILS_PARSE_ENGINE env variable
+        self.parse_engine = kwargs.get("parse_engine")
+        # Stage types as DATE, TIMESTAMP_NTZ, NUMBER(p,s) and VARCHAR(n) instead of TEXT/FLOAT
+        self.precise_types = kwargs.get("precise_types", True)
+        # Reuse the profile of an unchanged file from a sqlite cache under the configs dir
+        self.profile_cache = kwargs.get("profile_cache", True)
+        self.profile_cache_max_bytes = kwargs.get("profile_cache_max_bytes", PROFILE_CACHE_MAX_BYTES)
+        # Only generate configs when the file's schema drifted from the current version, as a new version
+        self.drift_mode = kwargs.get("drift_mode", False)
+        # Date the new version starts from in drift mode, the previous version ends the day before
+        self.effective_date = kwargs.get("effective_date", datetime.today().strftime("%Y-%m-%d"))
+        # Infer the schema over a date-stratified sample of the files under dataset_path instead of file_path alone
+        self.infer_from_dataset = kwargs.get("infer_from_dataset", False)
+        self.schema_sample_size = kwargs.get("schema_sample_size", 12)
         self.layer = kwargs.get("layer", "Mirror -> Stage -> Standard")
         layer_parts = self.layer.split(" -> ")
         layer_0_name = layer_parts[0].upper() if len(layer_parts) > 0 else "MIRROR"
@@ -40,6 +73,12 @@ class ConfigTemplate():
         self.layer_0_db = kwargs.get("layer_0_db", f"{layer_0_name}_DB")
         self.layer_1_db = kwargs.get("layer_1_db", f"{layer_1_name}_DB")
         self.schema = kwargs.get("schema", layer_0_name)
+        # OutputSink the configs are written through, e.g. MemorySink or ArchiveSink, defaults to the file system
+        self.sink = kwargs.get("sink") or FileSystemSink()
+        self.generation_report = None
+        self.file_profile = None
+        self.schema_drift = None
+        self.dataset_schema = None
 
     def add_meta_cols(self, schema, layer, db_type):
         layer = layer.upper()
@@ -100,12 +139,158 @@ class ConfigTemplate():
         stage_schema = {f'{k}': v for k, v in stage_schema.items()}
         return stage_schema
 
-    def generate_configs(self, configs_tmp_dir):
-        # Trying to apply schema inference on file data and get delimiter, file schema, data types
-        delimiter, columns, data_types = read_and_infer(self.file_path)
+    def get_profile_params(self):
+        return {"full_scan": self.full_scan_inference, "engine": self.parse_engine,
+                "precise_types": self.precise_types}
+
+    def get_profile_cache(self, configs_tmp_dir):
+        return ProfileCache(os.path.join(configs_tmp_dir, PROFILE_CACHE_FILE_NAME),
+                            max_bytes=self.profile_cache_max_bytes)
+
+    def get_file_profile(self, configs_tmp_dir):
+        # Profiled once per generation, drift detection and config generation share the profile
+        if self.file_profile is None:
+            if not self.profile_cache:
+                self.file_profile = build_file_profile(self.file_path, **self.get_profile_params())
+            else:
+                self.file_profile = self.get_profile_cache(configs_tmp_dir).get_file_profile(
+                    self.file_path, **self.get_profile_params())
+        return self.file_profile
+
+    def get_dataset_location(self):
+        """
+        Where the dataset's files are sampled from, the dataset_path prefix of the bucket when the dataset has one,
+        otherwise the local dataset_path directory.
+        """
+        if self.bucket:
+            return f"s3://{self.bucket}/{self.dataset_path.strip('/')}/"
+        return self.dataset_path
+
+    def read_json(self, file_path):
+        return json.loads(self.sink.read(file_path))
+
+    def get_current_version(self, versions):
+        """
+        Returns the version entry whose start and end dates cover the effective date, or the latest version.
+        """
+        return get_current_version(versions, self.effective_date)
+
+    def roll_over_versions(self, versions):
+        """
+        Closes the current version the day before the effective date and appends a new version starting
+        on the effective date. When the current version already ended before the effective date, it is left as
+        it is and the new version stays open.
+
+        :param versions: Versions list of a DatasetVersion config
+        :return: Updated versions list and the version to write
+        """
+        current_version = self.get_current_version(versions)
+        # Drifted again on the day the current version started, it is replaced instead of closed
+        if current_version["start_date"] >= self.effective_date:
+            return versions, current_version["version"]
+
+        new_version = f"v{max(int(version_info['version'][1:]) for version_info in versions) + 1}"
+        previous_end_date = (datetime.strptime(self.effective_date, "%Y-%m-%d") - timedelta(days=1)).strftime(
+            "%Y-%m-%d")
+
+        versions = [dict(version_info) for version_info in versions]
+        if current_version["end_date"] < self.effective_date:
+            new_end_date = VERSION_OPEN_END_DATE
+        else:
+            new_end_date = current_version["end_date"]
+            for version_info in versions:
+                if version_info["version"] == current_version["version"]:
+                    version_info["end_date"] = previous_end_date
+        versions.append({"version": new_version, "start_date": self.effective_date, "end_date": new_end_date})
+        return versions, new_version
+
+    def detect_schema_drift(self, configs_tmp_dir, configs_dataset_dir):
+        """
+        Compares the file against the current version of the dataset configs. Columns are compared from the file
+        header alone. When they match, the file is profiled, once for both the check and the generation, and
+        a column drifts when its current stage type can't hold the file's values, see stage_type_holds.
+
+        :return: dict with drift, current_version, added_columns, removed_columns, reordered and changed_types
+        """
+        dataset_name = self.dataset_name
+        mirror_ver_path = os.path.join(configs_dataset_dir, "mirror", f"{dataset_name}_mirror_ver.json")
+        if not self.sink.exists(mirror_ver_path):
+            return {"drift": True, "current_version": None, "added_columns": [], "removed_columns": [],
+                    "reordered": False, "changed_types": {}}
+
+        current_version = self.get_current_version(self.read_json(mirror_ver_path)["versions"])["version"]
+        mirror_configs = self.read_json(os.path.join(configs_dataset_dir, "mirror",
+                                                     f"{dataset_name}_mirror_{current_version}.json"))
+
+        current_columns = list(mirror_configs["file_schema"])
+        file_columns = list(self.get_file_schema(read_file_header(self.file_path)))
+        schema_drift = {"current_version": current_version,
+                        "added_columns": [col for col in file_columns if col not in current_columns],
+                        "removed_columns": [col for col in current_columns if col not in file_columns],
+                        "reordered": False, "changed_types": {}}
+        schema_drift["reordered"] = not schema_drift["added_columns"] and not schema_drift["removed_columns"] \
+            and file_columns != current_columns
+
+        if file_columns == current_columns:
+            file_profile = self.get_file_profile(configs_tmp_dir)
+            stage_ver_path = os.path.join(configs_dataset_dir, "stage", f"{dataset_name}_stage_ver.json")
+            stage_version = self.get_current_version(self.read_json(stage_ver_path)["versions"])["version"]
+            stage_configs = self.read_json(os.path.join(configs_dataset_dir, "stage",
+                                                        f"{dataset_name}_stage_{stage_version}.json"))
+            stage_schema = self.get_stage_schema(file_profile.data_types, self.db_type)
+            schema_drift["changed_types"] = {col: [stage_configs["table_schema"].get(col), dtype]
+                                             for col, dtype in stage_schema.items()
+                                             if not stage_type_holds(stage_configs["table_schema"].get(col), dtype)}
+
+        schema_drift["drift"] = bool(schema_drift["added_columns"] or schema_drift["removed_columns"]
+                                     or schema_drift["reordered"] or schema_drift["changed_types"])
+        return schema_drift
+
+    def get_layer_versions(self, layer_dir, layer, report):
+        """
+        Returns the versions of a layer and the version to write. A new dataset starts at v1. When the layer
+        already has versions, drift mode rolls the current version over and otherwise the current version is
+        regenerated in place. Either way every other existing version file is kept as it is.
+        """
+        ver_path = os.path.join(layer_dir, f"{self.dataset_name}_{layer}_ver.json")
+        if not self.sink.exists(ver_path):
+            return DatasetVersion(dataset_name=self.dataset_name).versions, "v1"
+
+        versions = self.read_json(ver_path)["versions"]
+        if self.drift_mode:
+            versions, new_version = self.roll_over_versions(versions)
+        else:
+            new_version = self.get_current_version(versions)["version"]
+        for version_info in versions:
+            if version_info["version"] == new_version:
+                continue
+            version_path = os.path.join(layer_dir, f"{self.dataset_name}_{layer}_{version_info['version']}.json")
+            if self.sink.exists(version_path):
+                report.record(version_path, "unchanged")
+        return versions, new_version
 
-        # Trying to identify unique keys by extending each column from the first columns
-        unique_keys = get_unique_keys(self.file_path, delimiter, 1)
+    def generate_configs(self, configs_tmp_dir):
+        if self.drift_mode:
+            if self.pipeline_type == "SNOWPIPE":
+                raise ValueError("Drift mode needs versioned configs, it is not supported for SNOWPIPE pipelines")
+
+            configs_dataset_dir = os.path.join(configs_tmp_dir, "generated_configs", self.dataset_name)
+            self.schema_drift = self.detect_schema_drift(configs_tmp_dir, configs_dataset_dir)
+            logging.info(f"Schema drift of {self.file_path}: {self.schema_drift}")
+            if not self.schema_drift["drift"]:
+                return os.path.join(configs_tmp_dir, "generated_configs")
+
+        # Profile the file once, delimiter, data types and unique keys all come from the same parse
+        file_profile = self.get_file_profile(configs_tmp_dir)
+        delimiter, data_types, unique_keys = file_profile.delimiter, file_profile.data_types, file_profile.unique_keys
+
+        if self.infer_from_dataset:
+            # Types widened over the sampled files, the format and keys still come from file_path
+            cache_path = os.path.join(configs_tmp_dir, PROFILE_CACHE_FILE_NAME) if self.profile_cache else None
+            self.dataset_schema = infer_dataset_schema(self.get_dataset_location(), sample_size=self.schema_sample_size,
+                                                       file_date_format=self.datetime_format, cache_path=cache_path,
+                                                       **self.get_profile_params())
+            data_types = self.dataset_schema.data_types
 
         # Get the file schema which would be used to verify table and file schema is a match
         file_schema = self.get_file_schema(data_types)
@@ -119,13 +304,16 @@ class ConfigTemplate():
         dataset_name = self.dataset_name  # os.path.basename(os.path.dirname(self.file_path))
 
         configs_root_dir = os.path.join(configs_tmp_dir, "generated_configs")
-        Path(configs_root_dir).mkdir(parents=True, exist_ok=True)
+        self.sink.makedirs(configs_root_dir)
 
         # Creating root dir as generated_configs to store all the generated dataset configs
         configs_dataset_dir = os.path.join(configs_root_dir, dataset_name)
 
+        # Unchanged outputs are not rewritten, the report lists what changed in this run
+        report = GenerationReport()
+
         # create folder as dataset name
-        Path(configs_dataset_dir).mkdir(parents=True, exist_ok=True)
+        self.sink.makedirs(configs_dataset_dir)
 
         # Generates pipelines either for Snowflake using snowpipe, stream, tasks , no airflow dags, operators
         if self.pipeline_type == "SNOWPIPE":
@@ -171,11 +359,20 @@ class ConfigTemplate():
 
                 print(result) */
                 """
-            file_extension = os.path.basename(self.file_path).split(".")[-1]
+            if file_profile.file_type == "ARROW":
+                raise ValueError(f"Snowpipe can't load Arrow IPC files, convert {self.file_path} to Parquet")
+
+            # Extension carries the detected compression, e.g. csv.gz, so the pipe pattern matches the compressed files
+            file_extension = get_file_extension(self.file_path, file_profile.compression)
 
             pipeline = SnowflakePipeline(bucket=self.bucket, dataset_path=self.dataset_path,
                                          dataset_name=self.dataset_name, file_extension=file_extension,
-                                         delimiter=delimiter, mirror_schema=mirror_schema, file_schema=file_schema,
+                                         delimiter=delimiter, quote_char=file_profile.quote_char,
+                                         record_delimiter=file_profile.line_terminator,
+                                         compression=file_profile.compression,
+                                         file_type=file_profile.file_type,
+                                         source_columns=dict(zip(file_profile.header, file_profile.columns)),
+                                         mirror_schema=mirror_schema, file_schema=file_schema,
                                          aws_access_key=self.aws_access_key, aws_secret_key=self.aws_secret_key,
                                          kms_key_id=self.kms_key_id,
                                          stage_schema=stage_schema, schedule_interval=self.schedule_interval,
@@ -192,7 +389,7 @@ class ConfigTemplate():
             if len(pipeline_sqls_path) > 255:
                 pipeline_sqls_path = r'\\?\{}'.format(pipeline_sqls_path)
 
-            write_to_file(data=pipeline_sqls, file_path=pipeline_sqls_path)
+            write_to_file(data=pipeline_sqls, file_path=pipeline_sqls_path, report=report, sink=self.sink)
 
         # Create pipelines using Airflow, DBT, Snowflake
         else:
@@ -236,68 +433,94 @@ class ConfigTemplate():
                                             stage_layer={"database": self.layer_1_db, "schema": layer_1_name},
                                             schedule_interval=self.schedule_interval)
 
-            write_to_json_file(data=ds_configs.__dict__, file_path=dataset_configs_path)
+            write_to_json_file(data=ds_configs.__dict__, file_path=dataset_configs_path, report=report,
+                               sink=self.sink)
 
             dataset_mirror_dir = os.path.join(configs_dataset_dir, "mirror")
-            Path(dataset_mirror_dir).mkdir(parents=True, exist_ok=True)
+            self.sink.makedirs(dataset_mirror_dir)
 
             dataset_configs_mirror_ver_path = os.path.join(dataset_mirror_dir, f"{dataset_name}_mirror_ver.json")
 
             if len(dataset_configs_mirror_ver_path) > 255:
                 dataset_configs_mirror_ver_path = r'\\?\{}'.format(dataset_configs_mirror_ver_path)
 
-            ds_mirror_ver_configs = DatasetVersion(dataset_name=dataset_name)
-
-            write_to_json_file(data=ds_mirror_ver_configs.__dict__, file_path=dataset_configs_mirror_ver_path)
-
-            file_format = {
-                "delimiter": delimiter,
-                "skip_header": 1,
-                "compressed": True
-            }
-            dataset_configs_mirror_v1_path = os.path.join(dataset_mirror_dir, f"{dataset_name}_mirror_v1.json")
-
-            if len(dataset_configs_mirror_v1_path) > 255:
-                dataset_configs_mirror_v1_path = r'\\?\{}'.format(dataset_configs_mirror_v1_path)
+            mirror_versions, mirror_version = self.get_layer_versions(dataset_mirror_dir, "mirror", report)
+            ds_mirror_ver_configs = DatasetVersion(dataset_name=dataset_name, versions=mirror_versions)
+
+            write_to_json_file(data=ds_mirror_ver_configs.__dict__, file_path=dataset_configs_mirror_ver_path,
+                               report=report, sink=self.sink)
+
+            if file_profile.file_type == "CSV":
+                file_format = {
+                    "file_type": file_profile.file_type,
+                    "delimiter": delimiter,
+                    "quote_char": file_profile.quote_char,
+                    "record_delimiter": file_profile.line_terminator,
+                    "skip_header": 1,
+                    "compressed": file_profile.compression != "NONE",
+                    "compression": file_profile.compression
+                }
+            else:
+                # Columnar files carry their schema and compression inside the file
+                file_format = {
+                    "file_type": file_profile.file_type,
+                    "skip_header": 0,
+                    "compressed": file_profile.compression != "NONE",
+                    "compression": file_profile.compression
+                }
+            dataset_configs_mirror_version_path = os.path.join(dataset_mirror_dir,
+                                                               f"{dataset_name}_mirror_{mirror_version}.json")
+
+            if len(dataset_configs_mirror_version_path) > 255:
+                dataset_configs_mirror_version_path = r'\\?\{}'.format(dataset_configs_mirror_version_path)
 
             file_name_pattern, datetime_pattern = get_file_name_pattern(os.path.basename(self.file_path),
                                                                         self.datetime_format)
             datetime_pattern = self.datetime_format if self.datetime_format else datetime_pattern.replace("%Y",
                                                                                                           "YYYY").replace(
                 "%m", "MM").replace("%d", "DD")
-            ds_mirror_v1_configs = DatasetMirror(table_name=f"T_ML_{dataset_name}".upper(),
-                                                 table_schema=mirror_schema,
-                                                 unique_keys=unique_keys,
-                                                 file_format_params=file_format,
-                                                 file_schema=file_schema,
-                                                 file_name_pattern=file_name_pattern,
-                                                 file_path=self.dataset_path,
-                                                 datetime_pattern=datetime_pattern,
-                                                 encoding=self.encoding)
-
-            write_to_json_file(data=ds_mirror_v1_configs.__dict__, file_path=dataset_configs_mirror_v1_path)
+            ds_mirror_version_configs = DatasetMirror(table_name=f"T_ML_{dataset_name}".upper(),
+                                                      table_schema=mirror_schema,
+                                                      unique_keys=unique_keys,
+                                                      file_format_params=file_format,
+                                                      file_schema=file_schema,
+                                                      file_name_pattern=file_name_pattern,
+                                                      file_path=self.dataset_path,
+                                                      datetime_pattern=datetime_pattern,
+                                                      encoding=self.encoding)
+
+            write_to_json_file(data=ds_mirror_version_configs.__dict__,
+                               file_path=dataset_configs_mirror_version_path, report=report, sink=self.sink)
 
             dataset_stg_dir = os.path.join(configs_dataset_dir, "stage")
-            Path(dataset_stg_dir).mkdir(parents=True, exist_ok=True)
+            self.sink.makedirs(dataset_stg_dir)
 
             dataset_configs_stage_ver_path = os.path.join(dataset_stg_dir, f"{dataset_name}_stage_ver.json")
 
             if len(dataset_configs_stage_ver_path) > 255:
                 dataset_configs_stage_ver_path = r'\\?\{}'.format(dataset_configs_stage_ver_path)
 
-            ds_stage_ver_configs = DatasetVersion(dataset_name=dataset_name)
+            stage_versions, stage_version = self.get_layer_versions(dataset_stg_dir, "stage", report)
+            ds_stage_ver_configs = DatasetVersion(dataset_name=dataset_name, versions=stage_versions)
+
+            write_to_json_file(data=ds_stage_ver_configs.__dict__, file_path=dataset_configs_stage_ver_path,
+                               report=report, sink=self.sink)
 
-            write_to_json_file(data=ds_stage_ver_configs.__dict__, file_path=dataset_configs_stage_ver_path)
+            dataset_configs_stage_version_path = os.path.join(dataset_stg_dir,
+                                                              f"{dataset_name}_stage_{stage_version}.json")
 
-            dataset_configs_stage_v1_path = os.path.join(dataset_stg_dir, f"{dataset_name}_stage_v1.json")
+            if len(dataset_configs_stage_version_path) > 255:
+                dataset_configs_stage_version_path = r'\\?\{}'.format(dataset_configs_stage_version_path)
 
-            if len(dataset_configs_stage_v1_path) > 255:
-                dataset_configs_stage_v1_path = r'\\?\{}'.format(dataset_configs_stage_v1_path)
+            ds_stage_version_configs = DatasetStage(table_name=f"T_STG_{dataset_name}".upper(),
+                                                    table_schema=stage_schema,
+                                                    unique_keys=unique_keys, )
 
-            ds_stage_v1_configs = DatasetStage(table_name=f"T_STG_{dataset_name}".upper(),
-                                               table_schema=stage_schema,
-                                               unique_keys=unique_keys, )
+            write_to_json_file(data=ds_stage_version_configs.__dict__,
+                               file_path=dataset_configs_stage_version_path, report=report, sink=self.sink)
 
-            write_to_json_file(data=ds_stage_v1_configs.__dict__, file_path=dataset_configs_stage_v1_path)
+        report.remove_stale_outputs(os.path.join(configs_dataset_dir, GENERATED_FILES_MANIFEST), sink=self.sink)
+        logging.info(f"Generated configs for {dataset_name}: {report.summary()}")
+        self.generation_report = report
 
         return configs_root_dir
\ No newline at end of file
@@ -22,7 +22,12 @@ class SnowflakePipeline():
         self.dataset_path = kwargs.get("dataset_path")
         self.dataset_name = kwargs.get("dataset_name")
         self.file_extension = kwargs.get("file_extension")
+        self.compression = kwargs.get("compression", "NONE")
+        self.file_type = kwargs.get("file_type", "CSV")
+        self.source_columns = kwargs.get("source_columns")
         self.delimiter = kwargs.get("delimiter")
+        self.quote_char = kwargs.get("quote_char", '"')
+        self.record_delimiter = kwargs.get("record_delimiter", "\n")
         self.mirror_schema = kwargs.get("mirror_schema")
         self.file_schema = kwargs.get("file_schema")
         self.stage_schema = kwargs.get("stage_schema")
@@ -228,7 +233,11 @@ class SnowflakePipeline():
             table_name=mirror_tr_table_name)
 
         file_format_sql = util.get_file_format_sql(file_format_name=file_format_name,
-                                                   delimiter=self.delimiter)
+                                                   delimiter=self.delimiter,
+                                                   quote_char=self.quote_char,
+                                                   record_delimiter=self.record_delimiter,
+                                                   compression=self.compression,
+                                                   file_type=self.file_type)
 
         mirror_tr_table_sql = util.get_mirror_stage_ddls(self.layer_0_db, self.layer_0_schema, mirror_tr_table_name,
                                                          self.mirror_schema, self.layer_0_schema, self.layer_0_schema)
@@ -244,7 +253,9 @@ class SnowflakePipeline():
 
         copy_statement = util.get_copy_into_table_sql(columns=columns,
                                                       file_extension=self.file_extension,
-                                                      file_format_name=file_format_name)
+                                                      file_format_name=file_format_name,
+                                                      file_type=self.file_type,
+                                                      source_columns=self.source_columns)
 
         snowpipe_sql = self.get_snowpipe_sql(copy_statement)
 
@@ -0,0 +1,27 @@
+import importlib
+
+from airflow.models import BaseOperator
+
+
+class LazyOperator(BaseOperator):
+    """
+    Stands in for an operator whose module is only imported when the task executes, so parsing a DAG doesn't
+    import the Snowflake, Postgres and boto stacks behind the operators. The real operator is built with
+    operator_kwargs and the same task_id, and its execute runs with the task's context.
+    Jinja templates in operator_kwargs are rendered before the real operator is built.
+    """
+    template_fields = ("operator_kwargs",)
+
+    def __init__(self, operator_module, operator_class, operator_kwargs=None, **kwargs):
+        super().__init__(**kwargs)
+        self.operator_module = operator_module
+        self.operator_class = operator_class
+        self.operator_kwargs = operator_kwargs or {}
+
+    def get_operator(self):
+        operator = getattr(importlib.import_module(self.operator_module), self.operator_class)
+        return operator(task_id=self.task_id, **self.operator_kwargs)
+
+    def execute(self, context):
+        self.log.info(f"Executing {self.operator_module}.{self.operator_class}")
+        return self.get_operator().execute(context)
@@ -33,13 +33,17 @@ class DatasetConfigs:
     schedule_interval: Optional[str] = field(default="0 23 * * 1-5")
 
 
+# End date of a version which is still open
+VERSION_OPEN_END_DATE = "9999-12-31"
+
+
 @dataclass
 class DatasetVersion:
     dataset_name: str
     versions: List[Dict] = field(default_factory=lambda: [{
         "version": "v1",
         "start_date": "2000-01-01",
-        "end_date": "9999-12-31"}])
+        "end_date": VERSION_OPEN_END_DATE}])
 
 
 @dataclass
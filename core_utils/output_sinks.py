@@ -0,0 +1,194 @@
+import hashlib
+import io
+import logging
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+
+
+def write_if_changed(data, file_path):
+    """
+    Writes data to file_path unless the file already holds the same content, so unchanged outputs keep their
+    mtime. Changed files are written to a temporary file next to file_path and renamed over it,
+    readers never see a partially written file.
+
+    :param data: Text to write
+    :param file_path: The path to the file
+    :return: changed or unchanged
+    """
+    content = data.encode('utf-8')
+    if os.path.exists(file_path) and os.path.getsize(file_path) == len(content):
+        with open(file_path, 'rb') as file:
+            if hashlib.sha256(file.read()).digest() == hashlib.sha256(content).digest():
+                return "unchanged"
+
+    tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file_path, 'wb') as file:
+            file.write(content)
+        os.replace(tmp_file_path, file_path)
+    finally:
+        if os.path.exists(tmp_file_path):
+            os.remove(tmp_file_path)
+    return "changed"
+
+
+class OutputSink():
+    """
+    Destination of generated configs, SQL, DAG and dbt files. Generators pass the same paths they would
+    write on disk, the sink decides where the content ends up.
+    """
+
+    def makedirs(self, dir_path):
+        pass
+
+    def write(self, file_path, data):
+        """
+        :return: changed or unchanged
+        """
+        raise NotImplementedError
+
+    def read(self, file_path):
+        raise NotImplementedError
+
+    def exists(self, file_path):
+        raise NotImplementedError
+
+    def remove(self, file_path):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Nothing is persisted from a failed generation
+        if exc_type is None:
+            self.close()
+
+
+class FileSystemSink(OutputSink):
+    """
+    Writes every output straight to its path, skipping files whose content is unchanged.
+    """
+
+    def makedirs(self, dir_path):
+        Path(dir_path).mkdir(parents=True, exist_ok=True)
+
+    def write(self, file_path, data):
+        try:
+            return write_if_changed(data, file_path)
+        except FileNotFoundError:
+            self.makedirs(os.path.dirname(file_path))
+            return write_if_changed(data, file_path)
+
+    def read(self, file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def exists(self, file_path):
+        return os.path.exists(file_path)
+
+    def remove(self, file_path):
+        os.remove(file_path)
+
+
+class MemorySink(OutputSink):
+    """
+    Keeps outputs in the files dict, keyed by their path relative to root_dir (or the normalised path
+    when no root_dir is given). Directories are implied by the paths, makedirs doesn't touch the disk.
+    """
+
+    def __init__(self, root_dir=None):
+        self.root_dir = os.path.abspath(root_dir) if root_dir else None
+        self.files = {}
+
+    def get_key(self, file_path):
+        if self.root_dir:
+            return Path(os.path.relpath(os.path.abspath(file_path), self.root_dir)).as_posix()
+        return Path(os.path.normpath(file_path)).as_posix()
+
+    def write(self, file_path, data):
+        key = self.get_key(file_path)
+        if self.files.get(key) == data:
+            return "unchanged"
+        self.files[key] = data
+        return "changed"
+
+    def read(self, file_path):
+        key = self.get_key(file_path)
+        if key not in self.files:
+            raise FileNotFoundError(file_path)
+        return self.files[key]
+
+    def exists(self, file_path):
+        return self.get_key(file_path) in self.files
+
+    def remove(self, file_path):
+        del self.files[self.get_key(file_path)]
+
+
+class ArchiveSink(MemorySink):
+    """
+    Collects outputs in memory and writes them as one tar (.tar, .tar.gz, .tgz) or zip archive on close,
+    with member names relative to root_dir (the working directory by default). An existing archive is loaded first,
+    so unchanged and stale outputs are reported against it, and the archive is only rewritten when something changed.
+    """
+
+    def __init__(self, archive_path, root_dir=None):
+        super().__init__(root_dir=root_dir or os.getcwd())
+        self.archive_path = archive_path
+        if os.path.exists(archive_path):
+            self.files = self.read_archive()
+        self.archived_files = dict(self.files)
+
+    def is_zip(self):
+        return self.archive_path.lower().endswith(".zip")
+
+    def read_archive(self):
+        files = {}
+        if self.is_zip():
+            with zipfile.ZipFile(self.archive_path, 'r') as archive:
+                for name in archive.namelist():
+                    files[name] = archive.read(name).decode('utf-8')
+        else:
+            with tarfile.open(self.archive_path, 'r:*') as archive:
+                for member in archive.getmembers():
+                    if member.isfile():
+                        files[member.name] = archive.extractfile(member).read().decode('utf-8')
+        return files
+
+    def close(self):
+        if self.files == self.archived_files:
+            logging.info(f"Archive {self.archive_path} is unchanged")
+            return
+
+        archive_dir = os.path.dirname(self.archive_path)
+        if archive_dir:
+            Path(archive_dir).mkdir(parents=True, exist_ok=True)
+
+        # Written next to the archive and renamed over it, like the file system outputs
+        tmp_archive_path = f"{self.archive_path}.{os.getpid()}.tmp"
+        try:
+            if self.is_zip():
+                with zipfile.ZipFile(tmp_archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                    for name in sorted(self.files):
+                        archive.writestr(name, self.files[name])
+            else:
+                mode = 'w:gz' if self.archive_path.lower().endswith((".tar.gz", ".tgz")) else 'w'
+                with tarfile.open(tmp_archive_path, mode) as archive:
+                    for name in sorted(self.files):
+                        content = self.files[name].encode('utf-8')
+                        member = tarfile.TarInfo(name)
+                        member.size = len(content)
+                        archive.addfile(member, io.BytesIO(content))
+            os.replace(tmp_archive_path, self.archive_path)
+        finally:
+            if os.path.exists(tmp_archive_path):
+                os.remove(tmp_archive_path)
+
+        self.archived_files = dict(self.files)
+        logging.info(f"Wrote {len(self.files)} files to {self.archive_path}")
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dataclasses import asdict
+
+from core_utils.file_profile import FileProfile, build_file_profile
+from core_utils.file_utils import is_s3_uri
+
+# Bytes hashed from the start and the end of a file for its fingerprint
+FINGERPRINT_BLOCK_SIZE = 65536
+PROFILE_CACHE_FILE_NAME = ".profile_cache.sqlite"
+PROFILE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Part of every cache key, bumped when profiles built from the same parameters change
+PROFILE_CACHE_VERSION = 3
+
+
+def get_file_fingerprint(file_path, block_size=FINGERPRINT_BLOCK_SIZE):
+    """
+    Fingerprints a file by its size, modification time and a sha1 of its first and last block_size bytes,
+    so unchanged files are recognised without reading them fully.
+
+    :param file_path: Path to the file, S3 objects are fingerprinted by their size, ETag and last modified time
+    :param block_size: Number of bytes hashed from the head and the tail of the file
+    :return: Fingerprint string
+    """
+    if is_s3_uri(file_path):
+        from core_utils.s3_utils import get_s3_object_fingerprint
+
+        return get_s3_object_fingerprint(file_path)
+
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        digest.update(file.read(block_size))
+        if stat.st_size > block_size:
+            file.seek(max(stat.st_size - block_size, block_size))
+            digest.update(file.read(block_size))
+
+    return f"{stat.st_size}-{stat.st_mtime_ns}-{digest.hexdigest()}"
+
+
+class ProfileCache():
+    """
+    On-disk cache of FileProfile results in a sqlite database, keyed by file fingerprint and profiling parameters.
+    Least recently used profiles are evicted once the stored profiles exceed max_bytes.
+    """
+
+    def __init__(self, cache_path, max_bytes=PROFILE_CACHE_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS profiles (
+                                    cache_key TEXT PRIMARY KEY,
+                                    profile TEXT NOT NULL,
+                                    size_bytes INTEGER NOT NULL,
+                                    last_access REAL NOT NULL)""")
+            connection.execute("CREATE INDEX IF NOT EXISTS profiles_last_access ON profiles (last_access)")
+
+    @contextmanager
+    def connect(self):
+        """
+        Yields a connection which commits when the block succeeds, rolls back otherwise, and is always closed.
+        """
+        with closing(sqlite3.connect(self.cache_path, timeout=30)) as connection, connection:
+            yield connection
+
+    @staticmethod
+    def get_cache_key(file_path, **profile_params):
+        params = json.dumps(dict(profile_params, cache_version=PROFILE_CACHE_VERSION), sort_keys=True, default=str)
+        return f"{get_file_fingerprint(file_path)}-{hashlib.sha1(params.encode()).hexdigest()}"
+
+    def get(self, cache_key):
+        with self.connect() as connection:
+            row = connection.execute("SELECT profile FROM profiles WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE profiles SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+
+        return FileProfile.from_dict(json.loads(row[0]))
+
+    def put(self, cache_key, file_profile):
+        profile = json.dumps(asdict(file_profile), default=lambda value: value.item() if hasattr(value, "item")
+                             else str(value))
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                               (cache_key, profile, len(profile), time.time()))
+            self.evict(connection)
+
+    def evict(self, connection):
+        total_bytes = connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM profiles").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        for cache_key, size_bytes in connection.execute(
+                "SELECT cache_key, size_bytes FROM profiles ORDER BY last_access").fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM profiles WHERE cache_key = ?", (cache_key,))
+            total_bytes -= size_bytes
+            evicted += 1
+        logging.info(f"Evicted {evicted} profiles from {self.cache_path}")
+
+    def get_file_profile(self, file_path, **profile_params):
+        """
+        Returns the cached profile of file_path when the file is unchanged since it was profiled with the same
+        parameters, otherwise builds the profile with build_file_profile and caches it.
+
+        :param file_path: Path to the file
+        :param profile_params: Keyword arguments of build_file_profile
+        :return: FileProfile
+        """
+        cache_key = self.get_cache_key(file_path, **profile_params)
+        file_profile = self.get(cache_key)
+        if file_profile is not None:
+            logging.info(f"Using cached profile of {file_path}")
+            # Same content may have been profiled under another path
+            file_profile.file_path = file_path
+            return file_profile
+
+        file_profile = build_file_profile(file_path, **profile_params)
+        self.put(cache_key, file_profile)
+        return file_profile
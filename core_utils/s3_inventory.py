@@ -0,0 +1,156 @@
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from datetime import date
+
+import numpy as np
+
+from core_utils.file_utils import classify_file_names
+from core_utils.s3_utils import get_s3_client
+
+S3_INVENTORY_FILE_NAME = ".s3_inventory.sqlite"
+
+
+class S3Inventory():
+    """
+    Local sqlite index of the objects under dataset prefixes, with their size, ETag, last modified time and the
+    file name pattern and date parsed from their names. Refreshes only list the keys after the last key seen,
+    so acquisition checks, downloads and gap reports query the index instead of listing S3 again.
+    Keys are expected to sort by date, as with YYYYMMDD or YYYY-MM-DD file dates; refresh with full=True
+    to pick up overwritten objects and deleted keys.
+    """
+
+    def __init__(self, inventory_path, s3_conn_id=None):
+        self.inventory_path = inventory_path
+        self.s3_conn_id = s3_conn_id
+        inventory_dir = os.path.dirname(inventory_path)
+        if inventory_dir:
+            os.makedirs(inventory_dir, exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS objects (
+                                    bucket TEXT NOT NULL,
+                                    prefix TEXT NOT NULL,
+                                    s3_key TEXT NOT NULL,
+                                    size INTEGER NOT NULL,
+                                    etag TEXT,
+                                    last_modified REAL,
+                                    file_name_pattern TEXT,
+                                    file_date TEXT,
+                                    first_seen REAL NOT NULL,
+                                    PRIMARY KEY (bucket, prefix, s3_key))""")
+            connection.execute("CREATE INDEX IF NOT EXISTS objects_file_date ON objects (bucket, prefix, file_date)")
+            connection.execute("""CREATE TABLE IF NOT EXISTS refreshes (
+                                    bucket TEXT NOT NULL,
+                                    prefix TEXT NOT NULL,
+                                    last_key TEXT,
+                                    refreshed_at REAL NOT NULL,
+                                    PRIMARY KEY (bucket, prefix))""")
+
+    @contextmanager
+    def connect(self):
+        """
+        Yields a connection which commits when the block succeeds, rolls back otherwise, and is always closed.
+        """
+        with closing(sqlite3.connect(self.inventory_path, timeout=30)) as connection, connection:
+            yield connection
+
+    def refresh(self, bucket_name, prefix, file_date_format=None, full=False):
+        """
+        Lists the objects added under prefix since the last refresh (StartAfter the last key seen) and indexes them.
+        A full refresh lists the whole prefix, updates changed objects and drops keys which no longer exist.
+
+        :param bucket_name: Name of the S3 bucket
+        :param prefix: Dataset prefix in the bucket
+        :param file_date_format: Date format of the file names (e.g. YYYY-MM-DD), detected when not given
+        :param full: List the whole prefix instead of the keys after the last key seen
+        :return: Keys which were not indexed before
+        """
+        with self.connect() as connection:
+            row = connection.execute("SELECT last_key FROM refreshes WHERE bucket = ? AND prefix = ?",
+                                     (bucket_name, prefix)).fetchone()
+        last_key = row[0] if row and not full else None
+
+        paginator = get_s3_client(self.s3_conn_id).get_paginator('list_objects_v2')
+        list_params = {"Bucket": bucket_name, "Prefix": prefix}
+        if last_key:
+            list_params["StartAfter"] = last_key
+        objects = {obj['Key']: obj for page in paginator.paginate(**list_params) for obj in page.get('Contents', [])
+                   if not obj['Key'].endswith("/")}
+
+        # File name patterns and dates are parsed for the whole listing in one pass
+        parsed = {}
+        for file_name_pattern, classified in classify_file_names(objects, file_date_format).items():
+            for file_date, keys in classified["files"].items():
+                parsed.update({key: (file_name_pattern, file_date.isoformat()) for key in keys})
+            parsed.update({key: (file_name_pattern, None) for key in classified["undated_files"]})
+
+        now = time.time()
+        with self.connect() as connection:
+            known_keys = {key for key, in connection.execute(
+                "SELECT s3_key FROM objects WHERE bucket = ? AND prefix = ?", (bucket_name, prefix))}
+            new_keys = sorted(key for key in objects if key not in known_keys)
+            connection.executemany(
+                """INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (bucket, prefix, s3_key) DO UPDATE SET size = excluded.size, etag = excluded.etag,
+                   last_modified = excluded.last_modified, file_name_pattern = excluded.file_name_pattern,
+                   file_date = excluded.file_date""",
+                [(bucket_name, prefix, key, obj['Size'], obj.get('ETag', '').strip('"'),
+                  obj['LastModified'].timestamp() if obj.get('LastModified') else None, *parsed[key], now)
+                 for key, obj in objects.items()])
+
+            if full:
+                deleted_keys = known_keys - set(objects)
+                connection.executemany("DELETE FROM objects WHERE bucket = ? AND prefix = ? AND s3_key = ?",
+                                       [(bucket_name, prefix, key) for key in deleted_keys])
+                logging.info(f"Dropped {len(deleted_keys)} deleted keys of s3://{bucket_name}/{prefix}")
+
+            last_key = max([key for key in objects] + ([last_key] if last_key else []), default=None)
+            connection.execute("INSERT OR REPLACE INTO refreshes VALUES (?, ?, ?, ?)",
+                               (bucket_name, prefix, last_key, now))
+
+        logging.info(f"Indexed {len(new_keys)} new of {len(objects)} listed objects of s3://{bucket_name}/{prefix}")
+        return new_keys
+
+    def query(self, bucket_name, prefix, condition="", params=()):
+        with self.connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(f"""SELECT s3_key, size, etag, last_modified, file_name_pattern, file_date
+                                          FROM objects WHERE bucket = ? AND prefix = ? {condition}
+                                          ORDER BY s3_key""", (bucket_name, prefix, *params)).fetchall()
+        return [dict(row) for row in rows]
+
+    def files_for_date(self, bucket_name, prefix, run_date, file_name_pattern=None):
+        """
+        Indexed objects whose file name holds run_date, optionally of one file name pattern.
+        """
+        condition, params = "AND file_date = ?", [run_date.isoformat()]
+        if file_name_pattern:
+            condition, params = condition + " AND file_name_pattern = ?", params + [file_name_pattern]
+        return self.query(bucket_name, prefix, condition, params)
+
+    def new_since(self, bucket_name, prefix, since):
+        """
+        Objects first indexed after since (a datetime or epoch seconds), e.g. the start of the last run.
+        """
+        since = since.timestamp() if hasattr(since, "timestamp") else since
+        return self.query(bucket_name, prefix, "AND first_seen > ?", [since])
+
+    def gaps(self, bucket_name, prefix, start_date, end_date, file_name_pattern=None, holidays=None):
+        """
+        Business dates between start_date and end_date without an indexed file.
+
+        :param holidays: Dates which are not business dates
+        :return: List of dates
+        """
+        condition, params = "AND file_date BETWEEN ? AND ?", [start_date.isoformat(), end_date.isoformat()]
+        if file_name_pattern:
+            condition, params = condition + " AND file_name_pattern = ?", params + [file_name_pattern]
+        dates = {date.fromisoformat(row["file_date"]) for row in self.query(bucket_name, prefix, condition, params)}
+
+        business_days = np.arange(np.datetime64(start_date), np.datetime64(end_date) + 1, dtype="datetime64[D]")
+        business_days = business_days[np.is_busday(business_days,
+                                                   holidays=[np.datetime64(day) for day in holidays or []])]
+        return [day.item() for day in business_days if day.item() not in dates]
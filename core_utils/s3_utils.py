@@ -1,38 +1,472 @@
+import calendar
+import hashlib
+import io
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
 import boto3
-from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 import logging
 
-def download_s3_folder(s3_conn_id, bucket_name, s3_folder, local_dir):
+from core_utils.output_sinks import write_if_changed
+
+# Airflow connection used for s3:// inputs when none is passed, environment credentials when not set
+S3_CONN_ID_ENV = "CORE_UTILS_S3_CONN_ID"
+# Size of the byte ranges requested from object storage, overridable with CORE_UTILS_S3_BLOCK_SIZE
+S3_BLOCK_SIZE_ENV = "CORE_UTILS_S3_BLOCK_SIZE"
+S3_BLOCK_SIZE = 1 << 20
+# Sequential reads request up to this many blocks in one range
+S3_MAX_READAHEAD_BLOCKS = 8
+# Blocks are shared by every reader of the same object version in the process, e.g. the magic byte checks,
+# format sniffing and parsing of one profile all read the first block once
+S3_BLOCK_CACHE_BYTES = 64 * 1024 * 1024
+# download_s3_folder defaults, objects downloaded at the same time, and part size and parallel parts of one object
+S3_DOWNLOAD_WORKERS = 16
+S3_MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+S3_MULTIPART_CONCURRENCY = 4
+S3_PROGRESS_LOG_SECONDS = 10
+# Date prefixes listed at the same time by list_dataset_objects
+S3_LIST_WORKERS = 16
+S3_SYNC_MANIFEST = ".s3_sync_manifest.json"
+
+# Connection pool and retries of the cached S3 clients, overridable with environment variables
+S3_MAX_POOL_CONNECTIONS_ENV = "CORE_UTILS_S3_MAX_POOL_CONNECTIONS"
+S3_MAX_POOL_CONNECTIONS = 50
+S3_RETRY_MODE_ENV = "CORE_UTILS_S3_RETRY_MODE"
+S3_RETRY_MODE = "standard"
+S3_MAX_ATTEMPTS_ENV = "CORE_UTILS_S3_MAX_ATTEMPTS"
+S3_MAX_ATTEMPTS = 5
+
+S3_CLIENTS = {}
+S3_BLOCK_CACHE = OrderedDict()
+# Bytes held by S3_BLOCK_CACHE, kept up to date on every insert and eviction
+S3_BLOCK_CACHE_USED_BYTES = 0
+S3_LOCK = threading.Lock()
+
+
+def get_s3_client(s3_conn_id=None, max_pool_connections=None, retry_mode=None, max_attempts=None):
+    """
+    Returns an S3 client for the Airflow connection, or from the AWS_ACCESS_KEY and AWS_SECRET_ACCESS_KEY
+    environment variables when s3_conn_id is None. Clients are cached process wide by connection id, credentials
+    and client settings, so repeated calls reuse warm connections instead of resolving credentials and
+    opening TLS connections again. A forked worker process builds its own clients.
+
+    :param s3_conn_id: Airflow connection id
+    :param max_pool_connections: Size of the connection pool, defaults to CORE_UTILS_S3_MAX_POOL_CONNECTIONS or 50
+    :param retry_mode: botocore retry mode (legacy, standard or adaptive), defaults to CORE_UTILS_S3_RETRY_MODE
+                       or standard
+    :param max_attempts: Attempts per request, defaults to CORE_UTILS_S3_MAX_ATTEMPTS or 5
+    :return: boto3 S3 client
+    """
+    from botocore.config import Config
+
+    max_pool_connections = max_pool_connections or int(os.getenv(S3_MAX_POOL_CONNECTIONS_ENV,
+                                                                  S3_MAX_POOL_CONNECTIONS))
+    retry_mode = retry_mode or os.getenv(S3_RETRY_MODE_ENV, S3_RETRY_MODE)
+    max_attempts = max_attempts or int(os.getenv(S3_MAX_ATTEMPTS_ENV, S3_MAX_ATTEMPTS))
+    aws_access_key = os.getenv("AWS_ACCESS_KEY")
+    aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+    # Rotated environment credentials get a new client, the secret itself isn't kept in the key
+    credentials = (aws_access_key, hashlib.sha1((aws_secret_access_key or "").encode()).hexdigest()) \
+        if s3_conn_id is None else None
+    client_key = (os.getpid(), s3_conn_id, credentials, max_pool_connections, retry_mode, max_attempts)
+
+    with S3_LOCK:
+        if client_key not in S3_CLIENTS:
+            config = Config(max_pool_connections=max_pool_connections,
+                            retries={"mode": retry_mode, "max_attempts": max_attempts})
+            if s3_conn_id is None:
+                S3_CLIENTS[client_key] = boto3.client('s3', aws_access_key_id=aws_access_key,
+                                                      aws_secret_access_key=aws_secret_access_key, config=config)
+            else:
+                from airflow.providers.amazon.aws.hooks.s3 import S3Hook
+
+                S3_CLIENTS[client_key] = S3Hook(aws_conn_id=s3_conn_id, config=config).get_conn()
+            logging.info(f"Created S3 client for {s3_conn_id or 'environment credentials'} with "
+                         f"{max_pool_connections} pooled connections and {retry_mode} retries")
+        return S3_CLIENTS[client_key]
+
+
+def parse_s3_uri(s3_uri):
+    """
+    Splits s3://bucket/key into bucket and key.
+    """
+    bucket, _, key = s3_uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable, read only file object over an S3 object which fetches only the byte ranges that are read.
+    Ranges are block_size aligned, sequential reads double the range up to max_readahead_blocks blocks,
+    and blocks are kept in a process wide LRU cache keyed by the object's ETag.
+    """
+
+    def __init__(self, bucket, key, s3_client=None, block_size=None, max_readahead_blocks=S3_MAX_READAHEAD_BLOCKS):
+        self.bucket = bucket
+        self.key = key
+        self.s3_client = s3_client or get_s3_client(os.getenv(S3_CONN_ID_ENV))
+        self.block_size = block_size or int(os.getenv(S3_BLOCK_SIZE_ENV, S3_BLOCK_SIZE))
+        self.max_readahead_blocks = max_readahead_blocks
+        head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        self.size = head["ContentLength"]
+        self.etag = head.get("ETag", "")
+        self.position = 0
+        self.readahead_blocks = 1
+        self.last_block_index = None
+        self.bytes_fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        self.position = max(self.position, 0)
+        return self.position
+
+    def get_block(self, block_index):
+        global S3_BLOCK_CACHE_USED_BYTES
+
+        # Readers of the same object may use different block sizes, their blocks don't line up
+        cache_key = (self.bucket, self.key, self.etag, self.block_size, block_index)
+        with S3_LOCK:
+            if cache_key in S3_BLOCK_CACHE:
+                S3_BLOCK_CACHE.move_to_end(cache_key)
+                return S3_BLOCK_CACHE[cache_key]
+
+        # Sequential access grows the fetched range, a random access starts again from one block
+        if self.last_block_index is not None and block_index == self.last_block_index + 1:
+            self.readahead_blocks = min(self.readahead_blocks * 2, self.max_readahead_blocks)
+        else:
+            self.readahead_blocks = 1
+
+        start = block_index * self.block_size
+        end = min(start + self.readahead_blocks * self.block_size, self.size) - 1
+        request = {"Bucket": self.bucket, "Key": self.key, "Range": f"bytes={start}-{end}"}
+        # Pins every range to the version the size was read from, an overwritten object fails instead of mixing
+        if self.etag:
+            request["IfMatch"] = self.etag
+        data = self.s3_client.get_object(**request)["Body"].read()
+        self.bytes_fetched += len(data)
+
+        with S3_LOCK:
+            for offset in range(0, len(data), self.block_size):
+                block_key = (self.bucket, self.key, self.etag, self.block_size, block_index + offset // self.block_size)
+                previous_block = S3_BLOCK_CACHE.pop(block_key, None)
+                if previous_block is not None:
+                    S3_BLOCK_CACHE_USED_BYTES -= len(previous_block)
+                S3_BLOCK_CACHE[block_key] = data[offset:offset + self.block_size]
+                S3_BLOCK_CACHE_USED_BYTES += len(S3_BLOCK_CACHE[block_key])
+            while S3_BLOCK_CACHE_USED_BYTES > S3_BLOCK_CACHE_BYTES and len(S3_BLOCK_CACHE) > 1:
+                S3_BLOCK_CACHE_USED_BYTES -= len(S3_BLOCK_CACHE.popitem(last=False)[1])
+        return data[:self.block_size]
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+
+        block_index, block_offset = divmod(self.position, self.block_size)
+        block = self.get_block(block_index)
+        self.last_block_index = block_index
+        length = min(len(buffer), len(block) - block_offset)
+        buffer[:length] = block[block_offset:block_offset + length]
+        self.position += length
+        return length
+
+
+def open_s3_object(s3_uri, s3_conn_id=None, block_size=None):
+    """
+    Opens an S3 object for binary reading through ranged GET requests, nothing is downloaded up front.
+
+    :param s3_uri: s3://bucket/key
+    :param s3_conn_id: Airflow connection id, defaults to the CORE_UTILS_S3_CONN_ID environment variable
+    :param block_size: Size of the requested byte ranges, defaults to CORE_UTILS_S3_BLOCK_SIZE or 1 MB
+    :return: Buffered binary file object
+    """
+    bucket, key = parse_s3_uri(s3_uri)
+    reader = S3RangeReader(bucket, key, s3_client=get_s3_client(s3_conn_id or os.getenv(S3_CONN_ID_ENV)),
+                           block_size=block_size)
+    return io.BufferedReader(reader, buffer_size=reader.block_size)
+
+
+def get_s3_object_fingerprint(s3_uri, s3_conn_id=None):
+    """
+    Fingerprints an S3 object by its size, ETag and last modified time, without reading it.
+    """
+    bucket, key = parse_s3_uri(s3_uri)
+    head = get_s3_client(s3_conn_id or os.getenv(S3_CONN_ID_ENV)).head_object(Bucket=bucket, Key=key)
+    return f"{head['ContentLength']}-{head.get('ETag', '').strip(chr(34))}-{head['LastModified'].timestamp()}"
+
+
+def profile_s3_object(s3_uri, **profile_params):
+    """
+    Profiles an S3 object in place with ranged reads, only the blocks the profile parses are fetched.
+    Gzip, bz2 and zstd objects are decompressed while streaming.
+
+    :param s3_uri: s3://bucket/key
+    :param profile_params: Keyword arguments of build_file_profile
+    :return: FileProfile
+    """
+    from core_utils.file_profile import build_file_profile
+
+    return build_file_profile(s3_uri, **profile_params)
+
+
+def list_prefix(s3_client, bucket_name, prefix):
+    paginator = s3_client.get_paginator('list_objects_v2')
+    return [obj for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix) for obj in page.get('Contents', [])
+            if not obj['Key'].endswith("/")]
+
+
+def to_strptime_format(datetime_pattern):
+    """
+    Converts a datetime_pattern of the mirror configs, e.g. YYYYMMDD or YYYY-MM-DD, to its strptime form.
+    strptime formats are returned as they are.
+    """
+    if not datetime_pattern or "%" in datetime_pattern:
+        return datetime_pattern
+    return datetime_pattern.upper().replace("YYYY", "%Y").replace("MM", "%m").replace("DD", "%d")
+
+
+def get_date_prefixes(s3_folder, file_name_pattern, datetime_pattern, start_date, end_date=None):
+    """
+    Builds the narrowest key prefixes holding the files of a dataset between start_date and end_date, e.g.
+    data/sales_20240105 for sales_{datetime_pattern}.csv with YYYYMMDD. Months covered fully by the range are
+    listed with one month prefix (data/sales_202401) when the date format puts the day after the year and month.
+
+    :param s3_folder: Folder of the dataset files in the bucket
+    :param file_name_pattern: File name pattern of the mirror configs, e.g. sales_{datetime_pattern}.csv
+    :param datetime_pattern: Date format of the file names as in the mirror configs (YYYYMMDD) or strptime (%Y%m%d)
+    :param start_date: First date
+    :param end_date: Last date, defaults to start_date
+    :return: Sorted list of prefixes
+    """
+    folder = f"{s3_folder.rstrip('/')}/" if s3_folder else ""
+    datetime_pattern = to_strptime_format(datetime_pattern)
+    if "{datetime_pattern}" not in file_name_pattern or not datetime_pattern:
+        return [folder + file_name_pattern]
+
+    name_prefix = file_name_pattern.split("{datetime_pattern}")[0]
+    end_date = end_date or start_date
+    month_format = datetime_pattern.split("%d")[0]
+    coalesce_months = "%d" in datetime_pattern and "%Y" in month_format and "%m" in month_format
+
+    prefixes = set()
+    day = start_date
+    while day <= end_date:
+        month_end = date(day.year, day.month, calendar.monthrange(day.year, day.month)[1])
+        if coalesce_months and day.day == 1 and month_end <= end_date:
+            prefixes.add(folder + name_prefix + day.strftime(month_format))
+            day = month_end + timedelta(days=1)
+        else:
+            prefixes.add(folder + name_prefix + day.strftime(datetime_pattern))
+            day += timedelta(days=1)
+    return sorted(prefixes)
+
+
+def list_dataset_objects(s3_conn_id, bucket_name, s3_folder, file_name_pattern, datetime_pattern, start_date,
+                         end_date=None, max_workers=S3_LIST_WORKERS):
+    """
+    Lists the objects of a dataset for a date or date range, listing only the prefixes get_date_prefixes builds,
+    concurrently, instead of paginating the whole folder. Keys are matched against file_name_pattern, so other
+    files sharing a prefix are left out.
+
+    :param s3_conn_id: Airflow connection id, environment credentials when None
+    :param bucket_name: Name of the S3 bucket
+    :param s3_folder: Folder of the dataset files in the bucket
+    :param file_name_pattern: File name pattern of the mirror configs, e.g. sales_{datetime_pattern}.csv
+    :param datetime_pattern: Date format of the file names as in the mirror configs (YYYYMMDD) or strptime (%Y%m%d)
+    :param start_date: First date
+    :param end_date: Last date, defaults to start_date
+    :param max_workers: Number of prefixes listed at the same time
+    :return: dict of date -> list of objects as returned by list_objects_v2, undated patterns under None
+    """
+    from core_utils.file_utils import classify_file_names
+
+    s3_client = get_s3_client(s3_conn_id)
+    end_date = end_date or start_date
+    datetime_pattern = to_strptime_format(datetime_pattern)
+    prefixes = get_date_prefixes(s3_folder, file_name_pattern, datetime_pattern, start_date, end_date)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prefixes))) as executor:
+        objects = {obj['Key']: obj for prefix_objects in executor.map(
+            lambda prefix: list_prefix(s3_client, bucket_name, prefix), prefixes) for obj in prefix_objects}
+    logging.info(f"Listed {len(objects)} objects under {len(prefixes)} prefixes of s3://{bucket_name}/{s3_folder}")
+
+    if "{datetime_pattern}" not in file_name_pattern or not datetime_pattern:
+        return {None: [obj for key, obj in objects.items() if os.path.basename(key) == file_name_pattern]}
+
+    file_date_format = datetime_pattern.replace("%Y", "YYYY").replace("%m", "MM").replace("%d", "DD")
+    classified = classify_file_names(objects, file_date_format).get(file_name_pattern, {"files": {}})
+    return {file_date: [objects[key] for key in keys] for file_date, keys in sorted(classified["files"].items())
+            if start_date <= file_date <= end_date}
+
+
+def get_local_etag(file_path, etag, chunk_size=1 << 20):
+    """
+    Computes the ETag S3 gives a file uploaded in one part, the md5 of its content.
+    Multipart ETags depend on the part size of the upload and can't be recomputed, None is returned for them.
+    """
+    if "-" in etag:
+        return None
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_downloaded(obj, local_file_path, synced_objects):
+    """
+    Whether the local copy of an object matches its size and ETag, either as recorded by the previous sync
+    or, for files the sync manifest doesn't know, by hashing the local file.
+    """
+    if not os.path.exists(local_file_path) or os.path.getsize(local_file_path) != obj['Size']:
+        return False
+    etag = obj.get('ETag', '').strip('"')
+    synced_object = synced_objects.get(obj['Key'])
+    if synced_object is not None:
+        return synced_object['etag'] == etag and synced_object['mtime_ns'] == os.stat(local_file_path).st_mtime_ns
+    return get_local_etag(local_file_path, etag) == etag
+
+
+def get_sync_manifest_path(local_dir):
+    """
+    Path of the sync manifest of local_dir, kept in its parent directory.
     """
-    Download an entire folder from an S3 bucket to a local directory.
+    local_dir = os.path.abspath(local_dir)
+    return os.path.join(os.path.dirname(local_dir), f".{os.path.basename(local_dir)}{S3_SYNC_MANIFEST}")
 
+
+def download_s3_folder(s3_conn_id, bucket_name, s3_folder, local_dir, max_workers=S3_DOWNLOAD_WORKERS,
+                       multipart_chunksize=S3_MULTIPART_CHUNKSIZE, max_concurrency=S3_MULTIPART_CONCURRENCY,
+                       file_name_pattern=None, datetime_pattern=None, start_date=None, end_date=None):
+    """
+    Download an entire folder from an S3 bucket to a local directory. Objects are downloaded concurrently,
+    large objects in parallel parts, and objects whose local copy already matches their size and ETag are skipped,
+    so repeated syncs of a prefix only move new and changed objects. The ETags of downloaded objects are kept in
+    a .<local_dir name>.s3_sync_manifest.json file next to local_dir, so scans of local_dir only see the data.
+    Objects which failed to download fail the sync once the others are downloaded and recorded.
+
+    :param s3_conn_id: Airflow connection id, environment credentials when None
     :param bucket_name: Name of the S3 bucket
     :param s3_folder: Folder path in the S3 bucket
     :param local_dir: Local directory to save the files
+    :param max_workers: Number of objects downloaded at the same time
+    :param multipart_chunksize: Part size of multipart downloads, smaller objects are downloaded in one request
+    :param max_concurrency: Number of parts of one object downloaded at the same time
+    :param file_name_pattern: With datetime_pattern and start_date, only the files of the dataset between
+                              start_date and end_date are listed and downloaded, see list_dataset_objects
+    :param datetime_pattern: Date format of the file names, as in the mirror configs (YYYYMMDD) or strptime
+    :param start_date: First date to download
+    :param end_date: Last date to download, defaults to start_date
+    :return: Summary dict with downloaded, skipped and failed object counts, bytes and bytes_per_second
+    :raises RuntimeError: When any object failed to download
     """
-    if s3_conn_id is None:
-        aws_access_key = os.getenv("AWS_ACCESS_KEY")
-        aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+    from boto3.s3.transfer import TransferConfig
 
-        s3_client = boto3.client('s3', aws_access_key_id=aws_access_key,
-                                 aws_secret_access_key=aws_secret_access_key)
-    else:
-        s3_client = S3Hook(aws_conn_id=s3_conn_id).get_conn()
+    # Every worker and every part of a multipart download holds a connection while it transfers
+    s3_client = get_s3_client(s3_conn_id, max_pool_connections=max(max_workers * max_concurrency,
+                                                                    int(os.getenv(S3_MAX_POOL_CONNECTIONS_ENV,
+                                                                                  S3_MAX_POOL_CONNECTIONS))))
+    transfer_config = TransferConfig(multipart_threshold=multipart_chunksize, multipart_chunksize=multipart_chunksize,
+                                     max_concurrency=max_concurrency)
+    manifest_path = get_sync_manifest_path(local_dir)
+    synced_objects = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            synced_objects = json.load(file)
 
-    paginator = s3_client.get_paginator('list_objects_v2')
-    pages = paginator.paginate(Bucket=bucket_name, Prefix=s3_folder)
+    summary = {"downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    failed_keys = []
+    progress_lock = threading.Lock()
+    start_time = time.time()
+    last_log_time = [start_time]
+
+    def log_progress(force=False):
+        now = time.time()
+        if force or now - last_log_time[0] >= S3_PROGRESS_LOG_SECONDS:
+            last_log_time[0] = now
+            elapsed = max(now - start_time, 1e-9)
+            logging.info(f"s3://{bucket_name}/{s3_folder}: {summary['downloaded']} downloaded, "
+                         f"{summary['skipped']} skipped, {summary['failed']} failed, "
+                         f"{summary['bytes'] / 1024 / 1024:.1f} MB at {summary['bytes'] / elapsed / 1024 / 1024:.1f} MB/s")
 
-    for page in pages:
-        logging.info(page)
-        if 'Contents' in page:
-            for obj in page['Contents']:
+    def download_object(obj, local_file_path):
+        if is_downloaded(obj, local_file_path, synced_objects):
+            status = "skipped"
+        else:
+            # Create directories if they don't exist
+            os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+            s3_client.download_file(bucket_name, obj['Key'], local_file_path, Config=transfer_config)
+            status = "downloaded"
+
+        with progress_lock:
+            summary[status] += 1
+            if status == "downloaded":
+                summary["bytes"] += obj['Size']
+            synced_objects[obj['Key']] = {"etag": obj.get('ETag', '').strip('"'), "size": obj['Size'],
+                                          "mtime_ns": os.stat(local_file_path).st_mtime_ns}
+            log_progress()
+
+    if file_name_pattern and start_date:
+        dated_objects = list_dataset_objects(s3_conn_id, bucket_name, s3_folder, file_name_pattern, datetime_pattern,
+                                             start_date, end_date)
+        pages = [{'Contents': [obj for objects in dated_objects.values() for obj in objects]}]
+    else:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=bucket_name, Prefix=s3_folder)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for page in pages:
+            for obj in page.get('Contents', []):
                 s3_key = obj['Key']
+                # Folder placeholder objects
+                if s3_key.endswith("/"):
+                    continue
                 local_file_path = os.path.join(local_dir, os.path.relpath(s3_key, s3_folder))
+                futures[executor.submit(download_object, obj, local_file_path)] = s3_key
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Failed to download {futures[future]}: {e}")
+                with progress_lock:
+                    summary["failed"] += 1
+                    synced_objects.pop(futures[future], None)
+                    failed_keys.append(futures[future])
 
-                # Create directories if they don't exist
-                os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+    # Recorded even when some objects failed, the next sync retries only those
+    os.makedirs(local_dir, exist_ok=True)
+    write_if_changed(json.dumps(synced_objects, indent=2, sort_keys=True), manifest_path)
+    # Manifest of earlier syncs, which was written into local_dir
+    legacy_manifest_path = os.path.join(local_dir, S3_SYNC_MANIFEST)
+    if os.path.exists(legacy_manifest_path):
+        os.remove(legacy_manifest_path)
 
-                # Download the file
-                logging.info(f"Downloading {s3_key} to {local_file_path}")
-                s3_client.download_file(bucket_name, s3_key, local_file_path)
+    summary["elapsed_seconds"] = round(time.time() - start_time, 3)
+    summary["bytes_per_second"] = round(summary["bytes"] / max(summary["elapsed_seconds"], 1e-9))
+    summary["failed_keys"] = failed_keys
+    log_progress(force=True)
+    if failed_keys:
+        raise RuntimeError(f"Failed to download {len(failed_keys)} objects of s3://{bucket_name}/{s3_folder}: "
+                           f"{', '.join(sorted(failed_keys))}")
+    return summary
@@ -3,6 +3,11 @@ import logging
 from core_utils.constants import mirror_file_meta_cols, mirror_tr_meta_cols
 
 
+def escape_sql_literal(value):
+    # Line breaks and quotes are written as escape sequences inside single quoted Snowflake literals
+    return value.replace("\\", "\\\\").replace("'", "\\'").replace("\r", "\\r").replace("\n", "\\n")
+
+
 class SnowflakeUtils:
 
     def __init__(self, stage_name,table_name):
@@ -10,13 +15,24 @@ class SnowflakeUtils:
         self.table_name = table_name
 
 
-    def get_file_format_sql(self,file_format_name, file_type="CSV", delimiter=",",skip_header=1, compression="NONE"):
+    def get_file_format_sql(self,file_format_name, file_type="CSV", delimiter=",",skip_header=1, compression="NONE",
+                            quote_char='"', record_delimiter="\n"):
         # Define the SQL command to create the file format
 
+        # Parquet carries its own schema and codec, none of the delimited text options apply
+        if file_type == "PARQUET":
+            file_format_sql = f""" CREATE OR REPLACE FILE FORMAT {file_format_name}
+        TYPE = PARQUET
+        COMPRESSION = AUTO;
+        """
+            logging.info(f"File format sql: {file_format_sql}")
+            return file_format_sql
+
         file_format_sql = f""" CREATE OR REPLACE FILE FORMAT {file_format_name}
         TYPE = {file_type}
-        FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+        FIELD_OPTIONALLY_ENCLOSED_BY = '{escape_sql_literal(quote_char)}'
         FIELD_DELIMITER = '{delimiter}'
+        RECORD_DELIMITER = '{escape_sql_literal(record_delimiter)}'
         SKIP_HEADER = {skip_header}      
         TRIM_SPACE=TRUE,
         REPLACE_INVALID_CHARACTERS=TRUE,
@@ -31,9 +47,15 @@ class SnowflakeUtils:
 
 
 
-    def get_copy_into_table_sql(self, columns,file_extension, file_format_name, file_path=None):
+    def get_copy_into_table_sql(self, columns,file_extension, file_format_name, file_path=None, file_type="CSV",
+                                source_columns=None):
 
-        cols_list_str = ",".join([f"${index+1} as {col_name.upper()}" for index, col_name in enumerate(columns) if col_name not in mirror_file_meta_cols + mirror_tr_meta_cols ])
+        if file_type == "PARQUET":
+            # Parquet columns are matched by name, source_columns maps table columns to the names in the file
+            source_columns = source_columns or {}
+            cols_list_str = ",".join([f'$1:"{source_columns.get(col_name, col_name)}" as {col_name.upper()}' for col_name in columns if col_name not in mirror_file_meta_cols + mirror_tr_meta_cols ])
+        else:
+            cols_list_str = ",".join([f"${index+1} as {col_name.upper()}" for index, col_name in enumerate(columns) if col_name not in mirror_file_meta_cols + mirror_tr_meta_cols ])
 
         meta_cols = []
         for col in mirror_file_meta_cols: